@@ -0,0 +1,87 @@
+# Parser benchmarks
+#
+# Run from the project root with:
+#   python3 -m bench.parser
+
+import timeit
+import logging
+from io import StringIO
+
+from compiler import lekvar
+from compiler.jam import parser
+from compiler.jam.builtins import BUILTINS_PATH
+from compiler.jam.lexer import Lexer
+
+OPERATORS = ["+", "-", "*", "//", "%", "==", "<", "&&", "||"]
+
+# Generate lines of long arithmetic expressions
+def arithmeticSource(terms:int, lines:int = 1):
+    expressions = []
+    for line in range(lines):
+        expression = ["x = 1"]
+        for index in range(terms):
+            expression.append(OPERATORS[(index + line) % len(OPERATORS)])
+            expression.append(str(index))
+        expressions.append(" ".join(expression))
+    return "\n".join(expressions) + "\n"
+
+# Generate a single line calling a function with many float arguments
+def callSource(arguments:int):
+    return "f({})\n".format(", ".join("{0}.{0}".format(index) for index in range(arguments)))
+
+def parse(source:str, lazy:bool = False):
+    with lekvar.State.ioSource(StringIO(source)) as input:
+        parser.Parser(Lexer(input), logging.getLogger(), lazy).parseModule(False)
+
+# Time parsing a source, returning the best time of a number of runs
+def bench(source:str, repeat:int = 5, lazy:bool = False):
+    return min(timeit.repeat(lambda: parse(source, lazy), number=1, repeat=repeat))
+
+def benchArithmetic():
+    print("Long arithmetic expressions")
+    for terms in (10, 100, 1000, 10000):
+        source = arithmeticSource(terms, 10000 // terms)
+        print("  {:>5} terms x {:>4} lines: {:.4f}s".format(terms, 10000 // terms, bench(source)))
+
+def benchLongLine():
+    print("Single line calls with float arguments")
+    for arguments in (100, 1000, 10000):
+        print("  {:>5} arguments: {:.4f}s".format(arguments, bench(callSource(arguments))))
+
+# Time the parser's token buffer on its own, reading through a lexed source
+def benchTokenBuffer():
+    print("Token buffer")
+    source = arithmeticSource(10000)
+
+    def read(look_ahead:int, speculate:bool):
+        with lekvar.State.ioSource(StringIO(source)) as input:
+            instance = parser.Parser(Lexer(input), logging.getLogger())
+            while instance.lookAhead(look_ahead) is not None:
+                if speculate:
+                    mark = instance.mark()
+                    instance.next()
+                    instance.reset(mark)
+                instance.next()
+
+    for look_ahead in (1, 2, 4):
+        for speculate in (False, True):
+            time = min(timeit.repeat(lambda: read(look_ahead, speculate), number=1, repeat=5))
+            print("  look ahead {}{}: {:.4f}s".format(look_ahead, ", mark/reset" if speculate else "", time))
+
+def benchLazyBodies():
+    print("Builtins with lazy function bodies")
+    with open(BUILTINS_PATH) as f:
+        source = f.read()
+    for lazy in (False, True):
+        print("  {:>5}: {:.4f}s".format("lazy" if lazy else "eager", bench(source, lazy=lazy)))
+
+BENCHMARKS = [
+    benchArithmetic,
+    benchLongLine,
+    benchTokenBuffer,
+    benchLazyBodies,
+]
+
+if __name__ == "__main__":
+    for benchmark in BENCHMARKS:
+        benchmark()
@@ -0,0 +1,28 @@
+# Startup benchmarks
+#
+# Run from the project root with:
+#   python3 -m bench.startup
+
+import os
+import sys
+import timeit
+import subprocess
+
+JAM_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "jam")
+
+# Time running jam in a new process, returning the best time of a number of runs
+def bench(args:[str], repeat:int = 10):
+    command = [sys.executable, JAM_PATH] + args
+    return min(timeit.repeat(lambda: subprocess.check_output(command), number=1, repeat=repeat))
+
+def benchStartup():
+    print("Startup")
+    print("  jam --version: {:.4f}s".format(bench(["--version"])))
+
+BENCHMARKS = [
+    benchStartup,
+]
+
+if __name__ == "__main__":
+    for benchmark in BENCHMARKS:
+        benchmark()
@@ -1,2 +1,13 @@
-from . import jam, lekvar, llvm
+import importlib
+
+from . import jam, lekvar
 from .errors import *
+
+# Backends are only imported once they are used, as importing them may load
+# native libraries
+BACKENDS = ["llvm", "interpreter"]
+
+def loadBackend(name:str):
+    if name not in BACKENDS:
+        raise ValueError("Unknown backend {}".format(name))
+    return importlib.import_module("." + name, __name__)
@@ -1,13 +1,45 @@
+import os
+import re
+import hashlib
+from functools import lru_cache
+
 from .. import lekvar
 
-# Resolves the name of a scope
-def resolveName(scope:lekvar.BoundObject):
+# Resolves the name of a scope. Names in the given separately compiled modules
+# are prefixed by their module, so that they are unique across objects
+def resolveName(scope:lekvar.BoundObject, units:{lekvar.Module} = frozenset()):
     name = ""
     while scope.bound_context is not None:
         name = "." + scope.name + name
         scope = scope.parent
+
+    if scope in units:
+        return "lekvar" + moduleName(scope) + name
     return "lekvar" + name
 
+# The root module an object belongs to
+def rootModule(object:lekvar.BoundObject):
+    while object.parent is not None:
+        object = object.parent
+    return object
+
+# The part of names identifying a module loaded from a file, or "" for other
+# modules. It stays the same for as long as the file isn't moved
+def moduleName(module:lekvar.Object):
+    if not isinstance(module, lekvar.Module) or not isinstance(module.name, str):
+        return ""
+    return _fileModuleName(module.name)
+
+@lru_cache()
+def _fileModuleName(path:str):
+    if not os.path.isfile(path):
+        return ""
+
+    path = os.path.realpath(path)
+    name = os.path.splitext(os.path.basename(path))[0]
+    digest = hashlib.sha1(path.encode("UTF-8", "surrogateescape")).hexdigest()
+    return ".{}_{}".format(re.sub(r"\W", "_", name), digest[:8])
+
 # Mokeypatch a function into a lekvar class
 # The lekvar class is determined from the name of the function, which should be
 # in the following format: <class-name>_<function-name>
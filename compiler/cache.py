@@ -0,0 +1,140 @@
+import os
+import hashlib
+import tempfile
+
+# Caches of compiler results on disk, shared by all parts of the compiler.
+# Each cache is a directory of entries, addressed by keys which include the
+# compiler version, so that changing the compiler never reuses a stale entry.
+#
+# The size of each cache is limited. Reading an entry marks it as used, and
+# once a cache grows past its limit the least recently used entries are removed.
+
+COMPILER_PATH = os.path.dirname(os.path.abspath(__file__))
+
+# Environment variables controlling the cache
+CACHE_DIR_VARIABLE = "JAM_CACHE_DIR"
+NO_CACHE_VARIABLE = "JAM_NO_CACHE"
+# The size limit of each cache, in megabytes
+CACHE_SIZE_VARIABLE = "JAM_CACHE_SIZE"
+
+DEFAULT_CACHE_SIZE = 512
+
+_compiler_version = None
+
+# A hash of all compiler sources, identifying the compiler version
+def compilerVersion():
+    global _compiler_version
+    if _compiler_version is not None:
+        return _compiler_version
+
+    hash = hashlib.sha256()
+    for directory, directories, files in os.walk(COMPILER_PATH):
+        directories.sort()
+        for name in sorted(files):
+            if not name.endswith((".py", ".jm")): continue
+
+            path = os.path.join(directory, name)
+            hash.update(os.path.relpath(path, COMPILER_PATH).encode("UTF-8"))
+            with open(path, "rb") as f:
+                hash.update(f.read())
+
+    _compiler_version = hash.hexdigest()
+    return _compiler_version
+
+# The root directory of all jam caches, or None if caching is disabled
+def cacheDirectory():
+    if os.environ.get(NO_CACHE_VARIABLE):
+        return None
+
+    directory = os.environ.get(CACHE_DIR_VARIABLE)
+    if directory is None:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+        directory = os.path.join(base, "jam")
+    return directory
+
+# The size limit of each cache, in bytes
+def cacheSize():
+    try:
+        megabytes = float(os.environ.get(CACHE_SIZE_VARIABLE, DEFAULT_CACHE_SIZE))
+    except ValueError:
+        megabytes = DEFAULT_CACHE_SIZE
+    return int(megabytes * 1024 * 1024)
+
+# The path of an entry in one of the caches, or None if caching is disabled
+def entryPath(cache:str, key:str):
+    directory = cacheDirectory()
+    if directory is None:
+        return None
+    return os.path.join(directory, cache, key)
+
+# Read the data of a cache entry, or None if it isn't cached
+def readEntry(cache:str, key:str):
+    path = entryPath(cache, key)
+    if path is None:
+        return None
+
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        # Mark the entry as recently used
+        os.utime(path)
+    except OSError:
+        return None
+    return data
+
+# Write the data of a cache entry. Failing to write an entry is not an error
+def writeEntry(cache:str, key:str, data:bytes):
+    path = entryPath(cache, key)
+    if path is None:
+        return
+
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write atomically, so concurrent builds never read partial entries
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+        evict(cache)
+    except OSError:
+        pass
+
+# Remove the least recently used entries of a cache, until it fits its limit
+def evict(cache:str, size:int = None):
+    directory = cacheDirectory()
+    if directory is None:
+        return
+    if size is None:
+        size = cacheSize()
+
+    entries = []
+    total = 0
+    try:
+        names = os.listdir(os.path.join(directory, cache))
+    except OSError:
+        return
+
+    for name in names:
+        path = os.path.join(directory, cache, name)
+        try:
+            stat = os.lstat(path)
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+        total += stat.st_size
+
+    entries.sort()
+    for time, entry_size, path in entries:
+        if total <= size: break
+
+        try:
+            os.unlink(path)
+            total -= entry_size
+        except OSError:
+            pass
@@ -1,3 +1,58 @@
+from array import array
+from bisect import bisect_right
+
+# An index of the positions at which lines start in a source buffer.
+# Lines are indexed lazily, and only once per buffer. Buffers may grow, in
+# which case only the new part is indexed.
+class LineIndex:
+    buffer = None
+    encoding = None
+
+    def __init__(self, buffer, encoding:str = None):
+        self.buffer = buffer
+        self.encoding = encoding or "utf-8"
+
+        self.starts = array("L", [0])
+        self.indexed = 0
+
+    def _update(self):
+        buffer = self.buffer
+        if self.indexed >= len(buffer): return
+
+        newline = "\n" if isinstance(buffer, str) else b"\n"
+        position = buffer.find(newline, self.indexed)
+        while position >= 0:
+            self.starts.append(position + 1)
+            position = buffer.find(newline, position + 1)
+        self.indexed = len(buffer)
+
+    # Return a 3-tuple of the line number, start and end position of the line
+    # at position
+    def getLine(self, position:int):
+        self._update()
+
+        number = bisect_right(self.starts, position)
+        start = self.starts[number - 1]
+        if number < len(self.starts):
+            end = self.starts[number]
+        else:
+            end = len(self.buffer) + 1
+        return number, start, end
+
+    # Return the source text between two positions
+    def slice(self, start:int, end:int):
+        data = self.buffer[start:end]
+        if isinstance(data, bytes):
+            return data.decode(self.encoding, "replace")
+        return data
+
+    # Return the column of a position on the line starting at start. Columns
+    # count characters, which may span several bytes of the buffer
+    def column(self, start:int, position:int):
+        if isinstance(self.buffer, str):
+            return position - start
+        return len(self.slice(start, position))
+
 # A singular message for an error. An error is made up of multiple error messages
 # A error message defines the formatting of an error.
 class _ErrorMessage:
@@ -22,36 +77,30 @@ class _ErrorMessage:
         self.tokens = tokens
         self.source = source
 
-    # Return a 3-tuple of the line number, start and end position of the line
-    # at position in source
-    def _getLine(self, source:str, position:int):
-        number = source[:position].count("\n") + 1
-        start = position - len(source[:position].rpartition("\n")[2])
-        end = position + len(source[position:].partition("\n")[0]) + 1
-        return number, start, end
-
     def format(self):
         if self.source is None or self.tokens is None:
             return self.message, None
 
-        # Read in entire source (could be optimised)
-        self.source.seek(0)
-        source = self.source.read()
+        # Reuse the line index built by the lexer, if there is one
+        index = getattr(self.source, "line_index", None)
+        if index is None:
+            self.source.seek(0)
+            index = LineIndex(self.source.read())
 
         lines = {}
         for token in self.tokens:
-            number, start, end = self._getLine(source, token.start)
+            number, start, end = index.getLine(token.start)
             line = lines.setdefault(number, (set(), start, end))
-            line[0].update(set(range(token.start, token.end)))
+            line[0].update(range(index.column(start, token.start), index.column(start, min(token.end, end))))
 
         appendix = []
         for number, (highlights, start, end) in sorted(lines.items(), key=lambda a: a[0]):
             number_str = str(number)
             appendix.append("{}| {}{}| {}".format(
                 number_str,
-                source[start:end],
+                index.slice(start, end),
                 " " * len(number_str),
-                "".join(("^" if i in highlights else " ") for i in range(start, end))
+                "".join(("^" if i in highlights else " ") for i in range(index.column(start, end)))
             ))
 
         return self.message, "\n".join(appendix)
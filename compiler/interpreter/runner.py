@@ -246,7 +246,7 @@ def Method_evalContext(self):
 
 @patch
 def Method_evalCall(self, values):
-    call = lekvar.FunctionType([value.resolveType() for value in values])
+    call = lekvar.FunctionType.intern([value.resolveType() for value in values])
     call.verify()
     function = self.resolveCall(call)
 
@@ -272,7 +272,7 @@ def MethodInstance_eval(self):
 def MethodInstance_evalCall(self, values):
     method = State.self
 
-    call = lekvar.FunctionType([value.resolveType() for value in values])
+    call = lekvar.FunctionType.intern([value.resolveType() for value in values])
     function = method.resolveCall(call)
 
     return function.evalCall(values)
@@ -2,7 +2,10 @@ import logging
 from io import IOBase
 
 from . import lexer
+from . import cache
 from . import parser
+from . import search_path
+from . import interface
 from .builtins import builtins
 # Lekvar extensions
 from . import import_
@@ -10,5 +13,27 @@ from . import operation
 from . import lambda_
 from . import pragma
 
-def parse(input:IOBase, logger = logging.getLogger()):
-    return parser.parseFile(input, logger=logger)
+def parse(input:IOBase, logger = logging.getLogger(), lazy = False):
+    module = parser.parseFile(input, logger=logger, lazy=lazy)
+    import_.preparse(input, logger)
+    return module
+
+def stream(input:IOBase, logger = logging.getLogger()):
+    module = parser.streamFile(input, logger=logger)
+    import_.preparse(input, logger)
+    return module
+
+# The key of a build of a program in the build cache, or None if it cannot be
+# cached
+def buildKey(input:IOBase, kind:str, opt_level:int, logger = logging.getLogger()):
+    if cache.cacheDirectory() is None:
+        return None
+
+    paths = import_.importedFiles(input, logger)
+    if paths is None:
+        return None
+
+    # Unused functions of lazily parsed modules are not verified
+    if import_.lazy:
+        kind += " lazy"
+    return cache.buildKey(paths, kind, opt_level)
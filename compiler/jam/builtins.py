@@ -5,19 +5,40 @@ from os import path
 
 from .. import lekvar
 
-from . import parser
+from . import parser, cache
 
 BUILTINS_FILE = "builtins.jm"
 BUILTINS_PATH = path.join(path.split(__file__)[0], BUILTINS_FILE)
 
 builtin_cache = None
 
-# Builtins uses the pickling module
-# to avoid parsing the builtin file more than once
+# Builtins are parsed and verified once, and then shared by every session. The
+# pickled builtins are kept on disk as a snapshot, shared between processes
 def builtins(logger = logging.getLogger()):
+    global builtin_cache
+
     if builtin_cache is not None:
-        return pickle.loads(builtin_cache)
+        return builtin_cache
+
+    snapshot = cache.loadSnapshot()
+    if snapshot is not None:
+        try:
+            builtin_cache = lekvar.share(pickle.loads(snapshot))
+            return builtin_cache
+        except cache.UNPICKLING_ERRORS as e:
+            # Unreadable snapshots are replaced
+            logger.info("Cannot load builtins snapshot: {}".format(e))
+
+    ir = parseBuiltins(logger)
+    with lekvar.State.ioSource(ir.source):
+        lekvar.verifyBuiltins(ir)
 
+    cache.storeSnapshot(pickle.dumps(ir, pickle.HIGHEST_PROTOCOL))
+
+    builtin_cache = lekvar.share(ir)
+    return builtin_cache
+
+def parseBuiltins(logger = logging.getLogger()):
     with open(BUILTINS_PATH, 'r') as f, lekvar.State.ioSource(io.StringIO(f.read())) as f:
         # Use StringIO because other files can't be pickled
         ir = parser.parseFile(f, logger)
@@ -49,7 +70,4 @@ def builtins(logger = logging.getLogger()):
         sizeof = lekvar.SizeOf("sizeOf", lekvar.VoidType(), lekvar.Identifier("Int"))
         ir.context.addChild(sizeof)
 
-    global builtin_cache
-    builtin_cache = pickle.dumps(ir)
-
     return ir
@@ -0,0 +1,166 @@
+import io
+import os
+import sys
+import pickle
+import logging
+import hashlib
+import platform
+from io import IOBase
+
+from ..cache import compilerVersion, cacheDirectory, readEntry, writeEntry
+from .lexer import readSource
+
+# Caches of the jam frontend. The parse cache stores parsed, unverified
+# modules of source files. Its entries are addressed by a hash of the source
+# contents and the compiler sources, so changing either never reuses a stale
+# entry. The build cache stores the results of compiling whole programs.
+
+PARSE_CACHE = "parse"
+BUILTINS_CACHE = "builtins"
+BUILD_CACHE = "build"
+
+#
+# Parse Cache
+#
+
+# Only sources read from real files are cached
+def cacheable(source:IOBase):
+    name = getattr(source, "name", None)
+    return isinstance(name, str) and os.path.isfile(name)
+
+def _sourceKey(source:IOBase, lazy:bool):
+    buffer = readSource(source)
+    if isinstance(buffer, str):
+        buffer = buffer.encode("UTF-8", "surrogatepass")
+
+    hash = hashlib.sha256(compilerVersion().encode("UTF-8"))
+    hash.update(b"lazy" if lazy else b"eager")
+    hash.update(buffer)
+    return hash.hexdigest()
+
+# The errors of reading pickles which are stale or corrupt
+UNPICKLING_ERRORS = (pickle.UnpicklingError, EOFError, AttributeError, ImportError)
+
+# Parsed modules reference their source file and its buffer, which cannot be
+# pickled. They are stored as references, and replaced by the source the
+# module is loaded for.
+
+class _ModulePickler(pickle.Pickler):
+    def __init__(self, file, source:IOBase):
+        pickle.Pickler.__init__(self, file, pickle.HIGHEST_PROTOCOL)
+        self.source = source
+
+    def persistent_id(self, object):
+        if object is self.source:
+            return "source"
+        elif object is getattr(self.source, "lex_buffer", None) and not isinstance(object, str):
+            return "buffer"
+        return None
+
+class _ModuleUnpickler(pickle.Unpickler):
+    def __init__(self, file, source:IOBase):
+        pickle.Unpickler.__init__(self, file)
+        self.source = source
+
+    def persistent_load(self, id):
+        if id == "source":
+            return self.source
+        elif id == "buffer":
+            return readSource(self.source)
+        raise pickle.UnpicklingError("Unknown persistent id {}".format(id))
+
+# Serialize a parsed module of a source, or return None if it cannot be pickled
+def dumpModule(source:IOBase, module):
+    data = io.BytesIO()
+    try:
+        _ModulePickler(data, source).dump(module)
+    except (pickle.PicklingError, RuntimeError, TypeError, AttributeError):
+        return None
+    return data.getvalue()
+
+# Deserialize a parsed module for a source, or return None if it cannot be read
+def undumpModule(source:IOBase, data:bytes, logger = logging.getLogger()):
+    try:
+        return _ModuleUnpickler(io.BytesIO(data), source).load()
+    except UNPICKLING_ERRORS as e:
+        logger.info("Cannot load parsed module of {}: {}".format(getattr(source, "name", source), e))
+        return None
+
+# Load the parsed module of a source from the cache, or None if it isn't cached
+def loadModule(source:IOBase, lazy:bool = False, logger = logging.getLogger()):
+    if cacheDirectory() is None or not cacheable(source):
+        return None
+
+    data = readEntry(PARSE_CACHE, _sourceKey(source, lazy))
+    if data is None:
+        return None
+
+    # Treat unreadable entries as missing, they are replaced when stored
+    return undumpModule(source, data, logger)
+
+# Store the parsed module of a source in the cache. Modules that cannot be
+# pickled are not cached
+def storeModule(source:IOBase, module, lazy:bool = False):
+    if cacheDirectory() is None or not cacheable(source):
+        return
+
+    data = dumpModule(source, module)
+    if data is not None:
+        writeEntry(PARSE_CACHE, _sourceKey(source, lazy), data)
+
+#
+# Builtins Snapshot
+#
+# The verified builtins module is stored as a single snapshot, so that
+# processes don't need to parse and verify it again. The compiler version
+# covers both the builtins source and the compiler sources verifying it.
+
+# Increment when the way builtins are prepared changes
+SNAPSHOT_VERSION = 1
+
+def _snapshotKey():
+    hash = hashlib.sha256(compilerVersion().encode("UTF-8"))
+    hash.update("snapshot {}".format(SNAPSHOT_VERSION).encode("UTF-8"))
+    return hash.hexdigest()
+
+# Load the pickled builtins snapshot, or None if there isn't one
+def loadSnapshot():
+    return readEntry(BUILTINS_CACHE, _snapshotKey())
+
+# Store a pickled builtins snapshot
+def storeSnapshot(data:bytes):
+    writeEntry(BUILTINS_CACHE, _snapshotKey(), data)
+
+#
+# Build Cache
+#
+# Compiled programs are stored by a hash of all their sources, so that
+# unchanged programs are not compiled again. The kind of result and the
+# optimisation level are part of the key.
+
+# The key of a build of a program from the canonical paths of its sources, or
+# None if the sources cannot be read
+def buildKey(paths:{str}, kind:str, opt_level:int):
+    hash = hashlib.sha256(compilerVersion().encode("UTF-8"))
+    hash.update("{} {} {} {}".format(kind, opt_level, sys.platform, platform.machine()).encode("UTF-8"))
+
+    for path in sorted(paths):
+        try:
+            with open(path, "rb") as f:
+                contents = f.read()
+        except OSError:
+            return None
+
+        hash.update(path.encode("UTF-8", "surrogateescape"))
+        hash.update(hashlib.sha256(contents).digest())
+    return hash.hexdigest()
+
+# Load a build result, or None if it isn't cached
+def loadBuild(key:str):
+    if key is None:
+        return None
+    return readEntry(BUILD_CACHE, key)
+
+def storeBuild(key:str, data:bytes):
+    if key is not None:
+        writeEntry(BUILD_CACHE, key, data)
@@ -1,6 +1,10 @@
 import os
+import logging
 
+from . import cache
+from . import interface
 from . import parser
+from .search_path import SearchPath
 
 from .. import errors
 from .. import lekvar
@@ -40,18 +44,19 @@ class Import(lekvar.Link, lekvar.BoundObject):
         else:
             if hasattr(self.source, "name"):
                 # Start from the path of the source
-                path = os.path.dirname(self.source.name)
+                directory = os.path.dirname(self.source.name)
             else:
                 # Otherwise use the cwd
-                path = "."
+                directory = "."
 
-            while index < len(self.path):
-                path = os.path.join(path, self.path[index])
-                index += 1
-                if os.path.isfile(path + ".jm"):
-                    with open(path + ".jm", "r") as f:
-                        self.parseSource(f)
-                        break
+            search_path = lekvar.State.search_path
+            if search_path is None:
+                search_path = lekvar.State.search_path = SearchPath()
+
+            found = search_path.find(directory, self.path)
+            if found is not None:
+                file, index = found
+                self.importFile(file)
 
             if self.value is None:
                 raise errors.ImportError(message="Cannot find file for").add(object=self)
@@ -61,31 +66,243 @@ class Import(lekvar.Link, lekvar.BoundObject):
 
         lekvar.Link.verify(self)
 
-    def parseSource(self, file):
-        previous_sources = lekvar.State.sources
+    def importFile(self, path:str):
+        modules = lekvar.State.modules
+        if modules is None:
+            modules = lekvar.State.modules = ModuleRegistry()
 
-        if lekvar.State.sources is None:
+            # The root module may be imported by the modules it imports
             object = self
             while object.parent is not None:
                 object = object.parent
-            lekvar.State.sources = ((self.source, object),)
-
-        # Check if we have already parsed the file
-        if hasattr(file, "fileno"):
-            for src, module in lekvar.State.sources:
-                if hasattr(src, "fileno") and os.path.sameopenfile(file.fileno(), src.fileno()):
-                    self.value = module
-                    break
-
-        if self.value is None:
-            self.value = parser.parseFile(file, lekvar.State.logger)
-            lekvar.State.sources = tuple(list(lekvar.State.sources) + [(file, module)])
-            # Must verify the module here, or imports in said module may use a closed file (self.source)
-            self.value.verify()
+            if hasattr(self.source, "name") and os.path.isfile(self.source.name):
+                modules.add(self.source.name, object)
 
-        lekvar.State.sources = previous_sources
+        importModule(path, self)
 
     def __repr__(self):
         return "import({})".format(self.value)
 
 lekvar.Import = Import
+
+# Whether the function bodies of imported modules are only parsed, and
+# verified, once they are used
+lazy = False
+
+# Whether imported modules are loaded from their up to date interfaces,
+# instead of being parsed and verified
+interfaces = False
+
+# Tells whether the object of a module compiled separately is cached, given
+# the key of the object. When set, only modules whose objects are cached are
+# loaded from interfaces, as the others need to be compiled with the program
+compiled = None
+
+# Import the module of a file, unless it has already been imported. The link
+# importing the module refers to it before it is verified, as the module may
+# import the module of the link in turn
+def importModule(path:str, link:lekvar.Link = None):
+    if link is None:
+        link = lekvar.Link(None)
+    modules = lekvar.State.modules
+
+    # Check if we have already imported the file
+    link.value = modules.find(path)
+    if link.value is not None:
+        return link.value
+
+    if interfaces:
+        link.value = _importInterface(path)
+        if link.value is not None:
+            link.value.verify()
+            return link.value
+
+    with open(path, "r") as f:
+        link.value = loadParsed(f)
+        if link.value is None:
+            link.value = parser.parseFile(f, lekvar.State.logger, lazy)
+        modules.add(path, link.value)
+        # Must verify the module here, or imports in said module may use a closed file (self.source)
+        link.value.verify()
+    return link.value
+
+def _importInterface(path:str):
+    modules = lekvar.State.modules
+    summary = modules.readInterface(path)
+    if summary is None:
+        return None
+
+    if compiled is not None:
+        key = interface.unitKey(path, modules.readInterface)
+        if key is None or not compiled(key):
+            return None
+    lekvar.State.logger.info("Loading {} from its interface".format(path))
+
+    module = interface.buildModule(summary, path)
+    # Modules importing this one may be imported while it is being built
+    modules.add(path, module)
+
+    try:
+        interface.fillModule(summary, module, importModule)
+    except interface.Unsupported:
+        lekvar.State.logger.info("Interface of {} is out of date".format(path))
+        return None
+    return module
+
+# The modules imported while verifying a program, by their files. Files are
+# identified by their canonical path, and by their inode so that hardlinks to
+# the same file are found as well.
+class ModuleRegistry:
+    paths = None
+    files = None
+    interfaces = None
+
+    def __init__(self):
+        self.paths = {}
+        self.files = {}
+        self.interfaces = {}
+
+    # Find the module imported from a file, or None if it hasn't been imported
+    def find(self, path:str):
+        real_path = os.path.realpath(path)
+        module = self.paths.get(real_path)
+        if module is not None:
+            return module
+
+        try:
+            module = self.files.get(self._fileId(real_path))
+        except OSError:
+            return None
+
+        if module is not None:
+            self.paths[real_path] = module
+        return module
+
+    def add(self, path:str, module:lekvar.Module):
+        real_path = os.path.realpath(path)
+        self.paths[real_path] = module
+        self.files[self._fileId(real_path)] = module
+
+    # Read the interface of a file, or None if it has no up to date interface.
+    # Each interface is only read once, as modules share their dependencies
+    def readInterface(self, path:str):
+        real_path = os.path.realpath(path)
+        if real_path not in self.interfaces:
+            self.interfaces[real_path] = interface.readInterface(real_path)
+        return self.interfaces[real_path]
+
+    # All imported modules, once each
+    def modules(self):
+        return list({id(module): module for module in self.paths.values()}.values())
+
+    def _fileId(self, path:str):
+        stat = os.stat(path)
+        return stat.st_dev, stat.st_ino
+
+#
+# Parallel Parsing
+#
+# Before verifying a program, the files it imports may be parsed by a pool of
+# worker processes. Imports are only resolved while verifying, so the import
+# graph is discovered by scanning each parsed file for import paths. Files
+# which fail to parse, or whose imports resolve differently while verifying,
+# are simply parsed again when they are imported.
+
+# The number of processes parsing imported files. 1 parses files as they are
+# imported
+jobs = 1
+
+# The pickled modules parsed ahead of being imported, by canonical path
+parsed = {}
+
+# Parse the files imported by a source, and everything they import, in parallel
+def preparse(source, logger = logging.getLogger()):
+    parsed.clear()
+    if jobs <= 1 or not cache.cacheable(source):
+        return
+
+    try:
+        imports = parser.scanImports(source, logger)
+    except errors.CompilerError:
+        return
+
+    from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+    search_path = SearchPath()
+    seen = set()
+
+    with ProcessPoolExecutor(jobs) as executor:
+        pending = set()
+
+        def submit(directory, paths):
+            for path in paths:
+                found = search_path.find(directory, path)
+                if found is None: continue
+
+                real_path = os.path.realpath(found[0])
+                if real_path not in seen:
+                    seen.add(real_path)
+                    pending.add(executor.submit(_parseImported, real_path, lazy))
+
+        seen.add(os.path.realpath(source.name))
+        submit(os.path.dirname(source.name), imports)
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                path, data, imports = future.result()
+                if data is not None:
+                    parsed[path] = data
+                submit(os.path.dirname(path), imports)
+
+# The canonical paths of a source file and of all files it may import. Imports
+# are found by scanning sources, which finds every file verification may
+# import. Returns None if any of the sources cannot be scanned
+def importedFiles(source, logger = logging.getLogger()):
+    if not cache.cacheable(source):
+        return None
+
+    search_path = SearchPath()
+    files = {os.path.realpath(source.name)}
+    try:
+        pending = [(source.name, parser.scanImports(source, logger))]
+        while pending:
+            path, imports = pending.pop()
+
+            for import_path in imports:
+                found = search_path.find(os.path.dirname(path), import_path)
+                if found is None: continue
+
+                real_path = os.path.realpath(found[0])
+                if real_path in files: continue
+                files.add(real_path)
+
+                with open(found[0], "r") as f:
+                    pending.append((found[0], parser.scanImports(f, logger)))
+    except (OSError, errors.CompilerError):
+        return None
+
+    return files
+
+# Parse an imported file in a worker process. Returns the path, the pickled
+# module or None if the file could not be parsed, and the import paths of the
+# file
+def _parseImported(path:str, lazy:bool = False):
+    logger = logging.getLogger()
+    try:
+        with open(path, "r") as f:
+            module = parser.parseFile(f, logger, lazy)
+            return path, cache.dumpModule(f, module), parser.scanImports(f, logger)
+    except Exception:
+        return path, None, []
+
+# Load the module parsed ahead of time for a source, or None if there isn't one
+def loadParsed(source):
+    data = parsed.pop(os.path.realpath(source.name), None)
+    if data is None:
+        return None
+
+    module = cache.undumpModule(source, data, lekvar.State.logger)
+    if module is not None:
+        module.name = source.name
+    return module
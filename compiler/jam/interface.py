@@ -0,0 +1,406 @@
+import os
+import json
+import hashlib
+import logging
+
+from .. import lekvar
+from ..cache import compilerVersion
+
+# Interfaces summarise the declarations of a verified module: its classes, the
+# signatures of its methods and the types of its variables. Importing a module
+# through an up to date interface skips parsing and verifying its source, as
+# only the declarations are needed to verify the importer.
+#
+# Objects are referenced by the path of names from the root of their module.
+# The root is either the builtins, the summarised module itself, or the
+# canonical path of another imported file.
+#
+# Functions are declared by the symbols they are defined by. Symbols are given
+# by the backend, as a function from the verified functions of a module.
+
+EXTENSION = ".jmi"
+
+# Increment when the format of interfaces changes
+INTERFACE_VERSION = 1
+
+# Raised for declarations an interface cannot describe
+class Unsupported(Exception):
+    pass
+
+def interfacePath(path:str):
+    return os.path.splitext(path)[0] + EXTENSION
+
+def _sourceHash(path:str):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+#
+# Summarising
+#
+
+# Summarise a verified module, or return None if it cannot be summarised.
+# Modules with top level instructions, or forward typed methods, need their
+# source to be used
+def summarize(module:lekvar.Module, symbol):
+    try:
+        return {
+            "version": INTERFACE_VERSION,
+            "compiler": compilerVersion(),
+            "source": _sourceHash(module.name),
+            "declarations": _summarizeModule(module, module, symbol),
+        }
+    except Unsupported:
+        return None
+
+def _summarizeModule(module:lekvar.Module, root:lekvar.Module, symbol):
+    if module.main:
+        raise Unsupported()
+
+    # Interfaces describe all declarations, including those not used yet
+    lekvar.verifyDeferred(module)
+    return [_summarize(child, root, symbol) for child in module.context]
+
+def _summarize(object, root:lekvar.Module, symbol):
+    if isinstance(object, lekvar.Import):
+        return {"kind": "import", "name": object.name, "value": _reference(object.value, root)}
+    elif isinstance(object, lekvar.Module):
+        return {"kind": "module", "name": object.name, "declarations": _summarizeModule(object, root, symbol)}
+    elif isinstance(object, lekvar.Class):
+        return _summarizeClass(object, root, symbol)
+    elif isinstance(object, lekvar.Method):
+        return _summarizeMethod(object, root, symbol)
+    elif isinstance(object, lekvar.ExternalFunction):
+        return dict(_summarizeSignature(object, root, symbol), kind = "external", name = object.name)
+    elif isinstance(object, lekvar.Variable):
+        stats = _summarizeStats(object.stats)
+        if "forward" in stats:
+            raise Unsupported()
+
+        return {
+            "kind": "variable",
+            "name": object.name,
+            "type": _reference(object.type, root),
+            "stats": stats,
+        }
+    raise Unsupported()
+
+def _summarizeClass(cls:lekvar.Class, root:lekvar.Module, symbol):
+    stats = _summarizeStats(cls.stats)
+    if "forward" in stats:
+        raise Unsupported()
+
+    attributes, methods = [], []
+    for child in cls.instance_context:
+        if isinstance(child, lekvar.Method):
+            methods.append(_summarizeMethod(child, root, symbol))
+        elif isinstance(child, lekvar.Variable):
+            attributes.append({"name": child.name, "type": _reference(child.type, root)})
+        else:
+            raise Unsupported()
+
+    constructor = None
+    if cls.constructor is not None:
+        constructor = _summarizeMethod(cls.constructor, root, symbol)["overloads"]
+
+    return {
+        "kind": "class",
+        "name": cls.name,
+        "attributes": attributes,
+        "constructor": constructor,
+        "methods": methods,
+        "stats": stats,
+    }
+
+def _summarizeMethod(method:lekvar.Method, root:lekvar.Module, symbol):
+    overloads = []
+    for overload in method.overload_context:
+        overloads.append(_summarizeSignature(overload, root, symbol))
+    return {"kind": "method", "name": method.name, "overloads": overloads}
+
+def _summarizeSignature(function, root:lekvar.Module, symbol):
+    stats = _summarizeStats(function.stats)
+    if "forward" in stats:
+        raise Unsupported()
+
+    if isinstance(function, lekvar.ExternalFunction):
+        name = function.external_name
+    else:
+        name = symbol(function)
+
+    type = function.resolveType()
+    return_type = None
+    if type.return_type is not None:
+        return_type = _reference(type.return_type, root)
+
+    return {
+        "symbol": name,
+        "arguments": [_reference(argument, root) for argument in type.arguments],
+        "return": return_type,
+        "stats": stats,
+    }
+
+def _summarizeStats(stats:lekvar.stats.Stats):
+    return [attr for attr in ("static", "forward") if getattr(stats, attr)]
+
+# Reference an object by the names leading to it from the root of its module
+def _reference(object, root:lekvar.Module):
+    value = object.resolveValue()
+
+    if isinstance(value, lekvar.FunctionType):
+        return_type = None
+        if value.return_type is not None:
+            return_type = _reference(value.return_type, root)
+        return ["function", [_reference(argument, root) for argument in value.arguments], return_type]
+
+    if not isinstance(value, (lekvar.Module, lekvar.Class)):
+        raise Unsupported()
+
+    names = []
+    while value.parent is not None:
+        if not isinstance(value.parent, lekvar.Module):
+            raise Unsupported()
+        names.insert(0, value.name)
+        value = value.parent
+
+    if value is lekvar.State.builtins:
+        return ["builtin"] + names
+    elif value is root:
+        return ["local"] + names
+    elif isinstance(value.name, str) and os.path.isfile(value.name):
+        return ["import", os.path.realpath(value.name)] + names
+    raise Unsupported()
+
+# Write the interfaces of verified modules next to their sources. Interfaces
+# are only rewritten when they change
+def writeInterfaces(modules:[lekvar.Module], symbol, logger = logging.getLogger()):
+    for module in modules:
+        if not isinstance(module.name, str) or not os.path.isfile(module.name):
+            continue
+
+        interface = summarize(module, symbol)
+        if interface is None:
+            logger.info("No interface for {}".format(module.name))
+            continue
+
+        data = json.dumps(interface, separators = (",", ":"), sort_keys = True)
+        path = interfacePath(module.name)
+        try:
+            with open(path, "r") as f:
+                if f.read() == data: continue
+        except OSError:
+            pass
+
+        with open(path, "w") as f:
+            f.write(data)
+
+#
+# Separate Compilation
+#
+# Modules are compiled separately when they, and every module they refer to,
+# have an interface. Their objects only depend on their own interface, which
+# includes the hash of their source, and the interfaces of the modules they
+# refer to.
+
+# The modules to compile separately, with the keys of their objects
+def compilationUnits(modules:[lekvar.Module], symbol):
+    summaries = {}
+    for module in modules:
+        if isinstance(module.name, str) and os.path.isfile(module.name):
+            summaries[os.path.realpath(module.name)] = module, summarize(module, symbol)
+
+    units = []
+    for path, (module, summary) in summaries.items():
+        dependencies = _dependencies(path, summaries)
+        if dependencies is None: continue
+
+        units.append((module, _unitKey({dependency: summaries[dependency][1] for dependency in dependencies})))
+    return units
+
+# The key of the object of a module compiled separately, from the up to date
+# interfaces of the module and of the modules it refers to, without verifying
+# any of them. Returns None if any of them has no up to date interface
+def unitKey(path:str, read = None):
+    if read is None:
+        read = readInterface
+
+    summaries = {}
+    pending = [os.path.realpath(path)]
+
+    while pending:
+        path = pending.pop()
+        if path in summaries: continue
+
+        summary = read(path)
+        if summary is None:
+            return None
+        summaries[path] = summary
+        pending.extend(_references(summary["declarations"]))
+
+    return _unitKey(summaries)
+
+# Hash the interfaces a module depends on, by their canonical paths
+def _unitKey(summaries):
+    hash = hashlib.sha256()
+    for path in sorted(summaries):
+        data = json.dumps(summaries[path], separators = (",", ":"), sort_keys = True)
+        hash.update("{}\n{}\n".format(path, data).encode("UTF-8"))
+    return hash.hexdigest()
+
+# All modules a module refers to, including itself, or None if any of them
+# has no interface
+def _dependencies(path:str, summaries):
+    dependencies = set()
+    pending = [path]
+
+    while pending:
+        path = pending.pop()
+        if path in dependencies: continue
+
+        if path not in summaries or summaries[path][1] is None:
+            return None
+        dependencies.add(path)
+        pending.extend(_references(summaries[path][1]["declarations"]))
+
+    return dependencies
+
+# The paths of all modules referred to in declarations
+def _references(value):
+    if isinstance(value, list):
+        if len(value) > 1 and value[0] == "import":
+            yield value[1]
+            return
+
+        for item in value:
+            yield from _references(item)
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _references(item)
+
+#
+# Loading
+#
+
+# Read the interface of a source file, or None if it is missing or out of date
+def readInterface(path:str):
+    try:
+        with open(interfacePath(path), "r") as f:
+            interface = json.load(f)
+        source = _sourceHash(path)
+    except (OSError, ValueError):
+        return None
+
+    if (not isinstance(interface, dict) or
+        interface.get("version") != INTERFACE_VERSION or
+        interface.get("compiler") != compilerVersion() or
+        interface.get("source") != source):
+        return None
+    return interface
+
+# Modules are built from interfaces in two steps. The skeleton of classes and
+# modules is created first, so that imported modules may refer back to it
+# before it is complete.
+def buildModule(interface, name:str):
+    module = lekvar.Module(name, [])
+    _buildSkeleton(module.context, interface["declarations"])
+    return module
+
+def _buildSkeleton(context:lekvar.Context, declarations):
+    for declaration in declarations:
+        if declaration["kind"] == "module":
+            module = lekvar.Module(declaration["name"], [])
+            _buildSkeleton(module.context, declaration["declarations"])
+            context.addChild(module)
+        elif declaration["kind"] == "class":
+            context.addChild(lekvar.Class(declaration["name"], None, []))
+
+# Complete a module built from an interface. importModule is used to find the
+# other modules it refers to. Raises Unsupported if the interface does not
+# match the modules it refers to
+def fillModule(interface, module:lekvar.Module, importModule):
+    try:
+        _fill(module.context, interface["declarations"], module, importModule)
+    except (KeyError, IndexError, TypeError, ValueError, OSError):
+        raise Unsupported()
+
+def _fill(context:lekvar.Context, declarations, root:lekvar.Module, importModule):
+    for declaration in declarations:
+        kind, name = declaration["kind"], declaration["name"]
+        resolve = lambda reference: _resolve(reference, root, importModule)
+
+        if kind == "module":
+            _fill(context[name].context, declaration["declarations"], root, importModule)
+        elif kind == "class":
+            _fillClass(context[name], declaration, resolve)
+        elif kind == "method":
+            context.addChild(_buildMethod(declaration, resolve))
+        elif kind == "external":
+            context.addChild(_buildFunction(name, declaration, resolve))
+        elif kind == "variable":
+            _checkStats(declaration)
+            context.addChild(lekvar.Variable(name, resolve(declaration["type"])))
+        elif kind == "import":
+            # Imports are already resolved
+            value = lekvar.Import([name], name)
+            value.value = resolve(declaration["value"])
+            value.verified = True
+            context.addChild(value)
+        else:
+            raise Unsupported()
+
+def _fillClass(cls:lekvar.Class, declaration, resolve):
+    _checkStats(declaration)
+
+    for attribute in declaration["attributes"]:
+        cls.instance_context.addChild(lekvar.Variable(attribute["name"], resolve(attribute["type"])))
+
+    for method in declaration["methods"]:
+        cls.instance_context.addChild(_buildMethod(method, resolve))
+
+    if declaration["constructor"] is not None:
+        cls.constructor = _buildMethod({"name": "", "overloads": declaration["constructor"]}, resolve)
+        cls.instance_context.fakeChild(cls.constructor)
+
+def _buildMethod(declaration, resolve):
+    overloads = [_buildFunction("", overload, resolve) for overload in declaration["overloads"]]
+    return lekvar.Method(declaration["name"], overloads)
+
+# Functions are declared by their symbol, and defined wherever their module is
+# compiled
+def _buildFunction(name:str, declaration, resolve):
+    _checkStats(declaration)
+
+    return_type = None
+    if declaration["return"] is not None:
+        return_type = resolve(declaration["return"])
+
+    arguments = [resolve(argument) for argument in declaration["arguments"]]
+    return lekvar.ExternalFunction(name, declaration["symbol"], arguments, return_type)
+
+# Declarations are built into objects which are static once verified, like the
+# objects they were summarised from
+def _checkStats(declaration):
+    if declaration["stats"] != ["static"]:
+        raise Unsupported()
+
+def _resolve(reference, root:lekvar.Module, importModule):
+    kind, *names = reference
+
+    if kind == "function":
+        arguments, return_type = names
+        if return_type is not None:
+            return_type = _resolve(return_type, root, importModule)
+        arguments = [_resolve(argument, root, importModule) for argument in arguments]
+        return lekvar.FunctionType.intern(arguments, return_type)
+    elif kind == "builtin":
+        value = lekvar.State.builtins
+    elif kind == "local":
+        value = root
+    elif kind == "import":
+        path, *names = names
+        value = importModule(path)
+    else:
+        raise Unsupported()
+
+    for name in names:
+        value = value.context[name]
+    return value
@@ -1,5 +1,11 @@
-from enum import Enum
+from enum import IntEnum
+import io
+import re
+import sys
+import mmap
+import codecs
 import string
+from array import array
 from io import IOBase
 
 from ..errors import *
@@ -33,12 +39,18 @@ class Node:
 
         assert self.token_type is not None
 
-        return Token(self.token_type, start, stop, value)
+        token_type = self.token_type
+        if token_type == Tokens.identifier:
+            token_type = KEYWORDS.get(value, token_type)
+
+        return Token(token_type, start, stop, value)
 
     def __repr__(self):
         return "Node(token:{})".format(self.token_type, self.links)
 
-Tokens = Enum("Tokens", [
+# Token types are integers, so they can be stored in token streams and
+# compared cheaply
+Tokens = IntEnum("Tokens", [
     "newline",
 
     "identifier",
@@ -142,70 +154,77 @@ node.links.append((node, lambda c: c != WYSIWYG_STRING_CHAR))
 end_node = Node(token_type=Tokens.string, verify=lambda s: s[1:-1])
 node.links.append((end_node, lambda c: c == WYSIWYG_STRING_CHAR))
 
-# Direct maps
-# Must be ordered by length for duplicated characters
-DIRECT_MAP = [
+# Operators
+# Lexed through a trie of their characters, so the longest operator matches
+OPERATORS = {
     # Operators
-    ("+", Tokens.addition),
-    ("-", Tokens.subtraction),
-    ("*", Tokens.multiplication),
-    ("//", Tokens.integer_division),
-    ("/", Tokens.division),
-    ("%", Tokens.mod),
-    ("==", Tokens.equality),
-    ("!=", Tokens.inequality),
-    ("<=", Tokens.smaller_than_or_equal_to),
-    ("<", Tokens.smaller_than),
-    (">=", Tokens.greater_than_or_equal_to),
-    (">", Tokens.greater_than),
-    ("!", Tokens.logical_negation),
-    ("&&", Tokens.logical_and),
-    ("||", Tokens.logical_or),
-    ("=>", Tokens.function),
+    "+": Tokens.addition,
+    "-": Tokens.subtraction,
+    "*": Tokens.multiplication,
+    "//": Tokens.integer_division,
+    "/": Tokens.division,
+    "%": Tokens.mod,
+    "==": Tokens.equality,
+    "!=": Tokens.inequality,
+    "<=": Tokens.smaller_than_or_equal_to,
+    "<": Tokens.smaller_than,
+    ">=": Tokens.greater_than_or_equal_to,
+    ">": Tokens.greater_than,
+    "!": Tokens.logical_negation,
+    "&&": Tokens.logical_and,
+    "||": Tokens.logical_or,
+    "=>": Tokens.function,
 
     # Instructions
-    ("(", Tokens.group_start),
-    (")", Tokens.group_end),
-    (":", Tokens.typeof),
-    ("->", Tokens.returns),
-    (",", Tokens.comma),
-    ("=", Tokens.assign),
-    (".", Tokens.dot),
-
+    "(": Tokens.group_start,
+    ")": Tokens.group_end,
+    ":": Tokens.typeof,
+    "->": Tokens.returns,
+    ",": Tokens.comma,
+    "=": Tokens.assign,
+    ".": Tokens.dot,
+}
+
+operator_nodes = {"": TREE}
+for value, token_type in OPERATORS.items():
+    for index, char in enumerate(value):
+        prefix = value[:index + 1]
+        if prefix not in operator_nodes:
+            node = Node()
+            operator_nodes[value[:index]].links.append((node, lambda c, char=char: c == char))
+            operator_nodes[prefix] = node
+    operator_nodes[value].token_type = token_type
+del operator_nodes
+
+# Keywords
+# Lexed as identifiers, then classified by lookup
+KEYWORDS = {
     # Keywords
-    ("const", Tokens.const_kwd),
-    ("ref", Tokens.ref_kwd),
-    ("def", Tokens.def_kwd),
-    ("end", Tokens.end_kwd),
-    ("return", Tokens.return_kwd),
-    ("class", Tokens.class_kwd),
-    ("new", Tokens.new_kwd),
-    ("as", Tokens.as_kwd),
-    ("module", Tokens.module_kwd),
-    ("loop", Tokens.loop_kwd),
-    ("while", Tokens.while_kwd),
-    ("for", Tokens.for_kwd),
-    ("in", Tokens.in_kwd),
-    ("break", Tokens.break_kwd),
-    ("self", Tokens.self_kwd),
-    ("elif", Tokens.elif_kwd),
-    ("if", Tokens.if_kwd),
-    ("else", Tokens.else_kwd),
-    ("import", Tokens.import_kwd),
-    ("pragma", Tokens.pragma_kwd),
+    "const": Tokens.const_kwd,
+    "ref": Tokens.ref_kwd,
+    "def": Tokens.def_kwd,
+    "end": Tokens.end_kwd,
+    "return": Tokens.return_kwd,
+    "class": Tokens.class_kwd,
+    "new": Tokens.new_kwd,
+    "as": Tokens.as_kwd,
+    "module": Tokens.module_kwd,
+    "loop": Tokens.loop_kwd,
+    "while": Tokens.while_kwd,
+    "for": Tokens.for_kwd,
+    "in": Tokens.in_kwd,
+    "break": Tokens.break_kwd,
+    "self": Tokens.self_kwd,
+    "elif": Tokens.elif_kwd,
+    "if": Tokens.if_kwd,
+    "else": Tokens.else_kwd,
+    "import": Tokens.import_kwd,
+    "pragma": Tokens.pragma_kwd,
 
     # Constants
-    ("true", Tokens.true_kwd),
-    ("false", Tokens.false_kwd),
-]
-
-for value, token_type in DIRECT_MAP:
-    node = TREE
-    for char in value:
-        next_node = Node()
-        node.links.append((next_node, lambda c, char=char: c == char))
-        node = next_node
-    node.token_type = token_type
+    "true": Tokens.true_kwd,
+    "false": Tokens.false_kwd,
+}
 
 # Identifiers
 WORD_CHARACTERS = set(string.ascii_letters + "_")
@@ -230,6 +249,138 @@ node.links.append((end_node, lambda c: c in DIGIT_CHARACTERS))
 end_node.links.append((underscore_node, lambda c: c == "_"))
 end_node.links.append((end_node, lambda c: c in DIGIT_CHARACTERS))
 
+#
+# Compilation
+#
+# The tree above is a non-deterministic automaton, where every character may
+# lead to several live nodes. To avoid evaluating every link of every live node
+# for every character, the tree is compiled into a deterministic transition
+# table once, through subset construction.
+
+# Characters that are not ASCII all behave like this one, as the tree only
+# distinguishes between ASCII characters
+OTHER_CHARACTER = "\x80"
+
+# The alphabet the tree is evaluated over. The empty string is read at EOF
+ALPHABET = [chr(i) for i in range(128)] + ["", OTHER_CHARACTER]
+
+def compileTree(tree:Node):
+    # Collect all nodes reachable from the tree
+    nodes = [tree]
+    for node in nodes:
+        for target, condition in node.links:
+            if target not in nodes:
+                nodes.append(target)
+
+    # Partition the alphabet into character classes, by which conditions
+    # each character passes. EOF always has its own class, as it ends lexing
+    conditions = [condition for node in nodes for target, condition in node.links]
+    signatures = {}
+    classes = {}
+    for char in ALPHABET:
+        signature = (char == "",) + tuple(bool(condition(char)) for condition in conditions)
+        classes[char] = signatures.setdefault(signature, len(signatures))
+
+    representatives = {}
+    for char, char_class in classes.items():
+        representatives.setdefault(char_class, char)
+    representatives = [representatives[index] for index in range(len(signatures))]
+
+    # Subset construction. States are ordered tuples of nodes, as the order
+    # determines which token type takes precedence
+    states = [(tree,)]
+    state_ids = {states[0]: 0}
+    transitions = []
+
+    for state in states:
+        row = []
+        for char in representatives:
+            targets = []
+            for node in state:
+                for target in node.evaluate(char):
+                    if target not in targets:
+                        targets.append(target)
+
+            if len(targets) == 0:
+                row.append(-1)
+                continue
+
+            targets = tuple(targets)
+            if targets not in state_ids:
+                state_ids[targets] = len(states)
+                states.append(targets)
+            row.append(state_ids[targets])
+        transitions.append(tuple(row))
+
+    # The first node with a token type determines a state's output
+    accepting = []
+    for state in states:
+        for node in state:
+            if node.token_type is not None:
+                accepting.append(node.token_type)
+                break
+        else:
+            accepting.append(0)
+
+    verifiers = {node.token_type: node.verify for node in nodes if node.verify is not None}
+
+    # Memory mapped buffers are indexed by byte value instead of character
+    for char in ALPHABET:
+        if len(char) == 1 and ord(char) < 128:
+            classes[ord(char)] = classes[char]
+
+    return classes, classes[OTHER_CHARACTER], tuple(transitions), tuple(accepting), verifiers
+
+CHARACTER_CLASSES, OTHER_CLASS, TRANSITIONS, ACCEPTING, VERIFIERS = compileTree(TREE)
+EOF_CLASS = CHARACTER_CLASSES[""]
+START_STATE = 0
+
+#
+# Source Buffers
+#
+
+# Encodings whose bytes can be lexed directly, as they share ASCII's encoding
+BYTE_ENCODINGS = {"utf-8", "ascii"}
+
+# Mapped buffers must not keep a duplicate file descriptor open, so that
+# importing many files doesn't exhaust the available descriptors. Where maps
+# can't be told so, the mapped source is copied and the map closed
+MMAP_TRACKFD = sys.version_info >= (3, 13)
+
+# Read an entire source into a buffer, which is cached on the source.
+# Real files are memory mapped, other sources are read in bulk.
+def readSource(source:IOBase):
+    buffer = getattr(source, "lex_buffer", None)
+    if buffer is not None:
+        return buffer
+
+    buffer = _mapSource(source)
+    if buffer is None:
+        buffer = source.read()
+
+    source.lex_buffer = buffer
+    return buffer
+
+def _mapSource(source:IOBase):
+    encoding = getattr(source, "encoding", None) or "utf-8"
+    if codecs.lookup(encoding).name not in BYTE_ENCODINGS:
+        return None
+
+    try:
+        if MMAP_TRACKFD:
+            buffer = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ, trackfd=False)
+        else:
+            with mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                buffer = mapped[:]
+    except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+        # Not a real file, or an empty one
+        return None
+
+    # Leave newline translation to the text layer
+    if buffer.find(b"\r") >= 0:
+        return None
+    return buffer
+
 #
 # Lexer
 #
@@ -246,24 +397,195 @@ class Token:
             return str(self.type)
         return "{}({})".format(self.type, self.data)
 
+# A compact store of all the tokens lexed from a source. Token attributes are
+# kept in parallel arrays and token data is sliced from the source buffer
+# when requested.
+class TokenStream:
+    buffer = None
+    encoding = None
+
+    types = None
+    starts = None
+    ends = None
+
+    def __init__(self, buffer, encoding:str = None):
+        self.buffer = buffer
+        self.encoding = encoding or "utf-8"
+
+        self.types = array("B")
+        self.starts = array("L")
+        self.ends = array("L")
+
+    # Add a token to the stream, returning a view of it
+    def append(self, type:int, start:int, end:int):
+        index = len(self.types)
+        self.types.append(type)
+        self.starts.append(start)
+        self.ends.append(end)
+        return TokenView(self, index, type)
+
+    # Return the source text between two positions
+    def slice(self, start:int, end:int):
+        data = self.buffer[start:end]
+        if isinstance(data, bytes):
+            return data.decode(self.encoding, "replace")
+        return data
+
+    def data(self, index:int):
+        type = self.types[index]
+        data = self.slice(self.starts[index], self.ends[index])
+
+        if type in VERIFIERS:
+            return VERIFIERS[type](data)
+        return data
+
+    def __getitem__(self, index:int):
+        return TokenView(self, index, self.types[index])
+
+    def __len__(self):
+        return len(self.types)
+
+# A handle to a single token in a token stream. Used like a Token
+class TokenView:
+    __slots__ = ("stream", "index", "type", "_data")
+
+    def __init__(self, stream:TokenStream, index:int, type:int):
+        self.stream = stream
+        self.index = index
+        self.type = type
+        self._data = None
+
+    @property
+    def start(self):
+        return self.stream.starts[self.index]
+
+    @property
+    def end(self):
+        return self.stream.ends[self.index]
+
+    # The data is decoded on first use, as the parser reads it repeatedly
+    @property
+    def data(self):
+        if self._data is None:
+            self._data = self.stream.data(self.index)
+        return self._data
+
+    def __repr__(self):
+        return "{}({})".format(Tokens(self.type), self.data)
+
 class Lexer:
     source = None
-    current = None
+    buffer = None
+    stream = None
+    line_index = None
     position = 0
 
+    # Interactive sources are read in chunks, as they become available
+    chunked = False
+    exhausted = False
+
     def __init__(self, source:IOBase):
         self.source = source
-        self.next()
 
-    # Read the next character into current
-    def next(self):
-        self.current = self.source.read(1)
-        self.position += 1
+        if hasattr(source, "readChunk"):
+            self.chunked = True
+            self.buffer = ""
+        else:
+            self.buffer = readSource(source)
+
+        self.stream = TokenStream(self.buffer, getattr(source, "encoding", None))
+
+        # Index lines once per source, for diagnostics
+        self.line_index = getattr(source, "line_index", None)
+        if self.line_index is None or self.line_index.buffer is not self.buffer:
+            self.line_index = source.line_index = LineIndex(self.buffer, self.stream.encoding)
+
+    # Append the next chunk of an interactive source to the buffer.
+    # Returns whether or not anything was read.
+    def fill(self):
+        if not self.chunked or self.exhausted:
+            return False
+
+        chunk = self.source.readChunk()
+        if not chunk:
+            self.exhausted = True
+            return False
+
+        self.buffer += chunk
+        self.source.lex_buffer = self.stream.buffer = self.line_index.buffer = self.buffer
+        return True
+
+    # Return the source text between two positions
+    def slice(self, start:int, end:int):
+        return self.stream.slice(start, end)
 
     #
     # Lexing Methods
     #
 
+    # Lex a single token
+    def lex(self):
+        classes, other_class, transitions = CHARACTER_CLASSES, OTHER_CLASS, TRANSITIONS
+
+        buffer = self.buffer
+        length = len(buffer)
+        position = self.position
+        token_start = position
+        state = START_STATE
+
+        while True:
+            if position < length:
+                char_class = classes.get(buffer[position], other_class)
+            elif self.fill():
+                buffer = self.buffer
+                length = len(buffer)
+                continue
+            else:
+                char_class = EOF_CLASS
+
+            next_state = transitions[state][char_class]
+
+            if next_state < 0:
+                self.position = position
+                return self.outputState(state, token_start, position)
+
+            if char_class == EOF_CLASS:
+                self.position = position
+                return None
+            position += 1
+
+            if next_state == START_STATE:
+                # Restart
+                token_start = position
+
+            state = next_state
+
+    def outputState(self, state, start, end):
+        token_type = ACCEPTING[state]
+        if token_type == Tokens.identifier:
+            token_type = KEYWORDS.get(self.slice(start, end), token_type)
+        if token_type:
+            return self.stream.append(token_type, start, end)
+        elif state == START_STATE and end >= len(self.buffer):
+            return None
+        raise SyntaxError(message="Unexpected character").add(content=self.slice(end, end + 1), tokens=[Token(None, end, end + 1)], source=self.source)
+
+# Reference lexer, evaluating the tree directly instead of the compiled table
+class NFALexer(Lexer):
+    current = None
+
+    def __init__(self, source:IOBase):
+        Lexer.__init__(self, source)
+        self.position = 0
+        self.next()
+
+    # Read the next character into current
+    def next(self):
+        if self.position >= len(self.buffer):
+            self.fill()
+        self.current = self.slice(self.position, self.position + 1)
+        self.position += 1
+
     # Lex a single token
     def lex(self):
         token_start = self.position - 1
@@ -302,3 +624,69 @@ class Lexer:
             elif node is TREE and not self.current:
                 return None
         raise SyntaxError(message="Unexpected character").add(content=self.current, tokens=[Token(None, self.position - 1, self.position)], source=self.source)
+
+#
+# Scanning
+#
+# Sources may be scanned for their tokens ahead of being lexed, such as to find
+# their declarations before parsing them. Scanning matches the tokens of the lex
+# tree through a single regular expression, which is several times faster than
+# lexing, but cannot report errors. Sources it cannot scan are left to the lexer.
+
+def _scanner(encode):
+    operators = sorted(OPERATORS, key=len, reverse=True)
+    pattern = (r"[ \t]+|\#[^\n]*\Z|"
+               r"(?P<newline>\#[^\n]*\n|\n)|"
+               r'(?P<format_string>"(?:[^"\\]|\\.)*")|'
+               r"(?P<string>`[^`]*`)|"
+               r"(?P<identifier>[A-Za-z_][A-Za-z0-9_]*)|"
+               r"(?P<integer>[0-9](?:_?[0-9])*)|"
+               r"(?P<operator>{})".format("|".join(re.escape(operator) for operator in operators)))
+
+    return (re.compile(encode(pattern), re.DOTALL),
+            {encode(word): type for word, type in KEYWORDS.items()},
+            {encode(operator): type for operator, type in OPERATORS.items()})
+
+SCANNERS = {
+    str: _scanner(lambda string: string),
+    bytes: _scanner(lambda string: string.encode("ascii")),
+}
+
+SCANNED_TOKENS = {
+    "newline": Tokens.newline,
+    "format_string": Tokens.format_string,
+    "string": Tokens.string,
+    "integer": Tokens.integer,
+}
+
+# Scan an entire source buffer into a new token stream. Returns None if the
+# buffer has anything the lexer would not accept
+def scanSource(buffer, encoding:str = None):
+    pattern, keywords, operators = SCANNERS[str if isinstance(buffer, str) else bytes]
+    stream = TokenStream(buffer, encoding)
+    types, starts, ends = stream.types, stream.starts, stream.ends
+
+    position = 0
+    for match in pattern.finditer(buffer):
+        start, end = match.span()
+        if start != position:
+            return None
+        position = end
+
+        kind = match.lastgroup
+        if kind is None:
+            continue
+        elif kind == "identifier":
+            type = keywords.get(match.group(), Tokens.identifier)
+        elif kind == "operator":
+            type = operators[match.group()]
+        else:
+            type = SCANNED_TOKENS[kind]
+
+        types.append(type)
+        starts.append(start)
+        ends.append(end)
+
+    if position != len(buffer):
+        return None
+    return stream
@@ -1,25 +1,60 @@
 import logging
 from io import IOBase
 from copy import copy
+from collections import deque
 
 from .. errors import *
 from .. import lekvar
 
-from .lexer import Lexer, Tokens
-from . import pragma
+from .lexer import Lexer, Tokens, scanSource
+from . import pragma, cache
 
 #
 # Tools
 #
 
-def parseFile(source:IOBase, logger=logging.getLogger()):
+# Parse a source into a module. Lazily parsed function bodies are only parsed
+# once their instructions are needed. Modules of source files are cached
+def parseFile(source:IOBase, logger=logging.getLogger(), lazy = False):
+    module = cache.loadModule(source, lazy, logger)
+    if module is not None:
+        # The same source may be cached for another file
+        if hasattr(source, "name"): module.name = source.name
+        return module
+
     with lekvar.State.ioSource(source):
         try:
-            module = Parser(Lexer(source), logger).parseModule(False)
+            module = Parser(Lexer(source), logger, lazy).parseModule(False)
             if hasattr(source, "name"): module.name = source.name
-            return module
         except CompilerError as e:
-            source.seek(0)
+            e.format()
+            raise e
+
+    cache.storeModule(source, module, lazy)
+    return module
+
+# Stream the top level of a source as declarations, for verification while the
+# rest of the source is being lexed and parsed
+def streamFile(source:IOBase, logger=logging.getLogger()):
+    with lekvar.State.ioSource(source):
+        try:
+            parser = Parser(Lexer(source), logger)
+            names, assigned = parser.scanModule()
+        except CompilerError as e:
+            e.format()
+            raise e
+
+    name = source.name if hasattr(source, "name") else "main"
+    module = lekvar.Module(name, [], [])
+
+    return lekvar.ModuleStream(module, parser.iterDeclarations(), names, assigned)
+
+# Scan a source for the paths of all modules it imports
+def scanImports(source:IOBase, logger=logging.getLogger()):
+    with lekvar.State.ioSource(source):
+        try:
+            return Parser(Lexer(source), logger).scanImports()
+        except CompilerError as e:
             e.format()
             raise e
 
@@ -44,6 +79,14 @@ BINARY_OPERATIONS = [
 
 BINARY_OPERATION_TOKENS = { type for operation in BINARY_OPERATIONS for type in operation }
 
+# Binding strength of binary operations, higher binding tighter
+BINARY_OPERATION_PRECEDENCES = { type: precedence for precedence, operation in enumerate(BINARY_OPERATIONS, 1)
+                                                  for type in operation }
+
+# Assignments bind the weakest, when they are allowed
+ASSIGNMENT_PRECEDENCES = dict(BINARY_OPERATION_PRECEDENCES)
+ASSIGNMENT_PRECEDENCES[Tokens.assign] = 0
+
 BINARY_OPERATION_FUNCTIONS = {
     Tokens.logical_and: "&&",
     Tokens.logical_or: "||",
@@ -64,32 +107,105 @@ MODIFIERS = {
 
 UNARY_OPERATION_TOKENS = set(UNARY_OPERATIONS)
 
+# Tokens starting blocks which are closed by an end keyword
+BLOCK_TOKENS = {
+    Tokens.def_kwd,
+    Tokens.new_kwd,
+    Tokens.class_kwd,
+    Tokens.module_kwd,
+    Tokens.if_kwd,
+    Tokens.while_kwd,
+    Tokens.loop_kwd,
+}
+
+# Blocks with their own scope, whose declarations are not module level
+HARD_BLOCK_TOKENS = {
+    Tokens.def_kwd,
+    Tokens.new_kwd,
+    Tokens.class_kwd,
+    Tokens.module_kwd,
+}
+
+# Names implicitly referred to by tokens
+IMPLICIT_MENTIONS = {
+    Tokens.integer: "Int",
+    Tokens.dot: "Real",
+    Tokens.string: "String",
+    Tokens.format_string: "String",
+    Tokens.true_kwd: "Bool",
+    Tokens.false_kwd: "Bool",
+    Tokens.logical_and: BINARY_OPERATION_FUNCTIONS[Tokens.logical_and],
+    Tokens.logical_or: BINARY_OPERATION_FUNCTIONS[Tokens.logical_or],
+}
+
+# The body of a lazily parsed function, parsed from the token stream when
+# called. Returns the instructions and children of the body
+class LazyBody:
+    lexer = None
+    position = None
+    logger = None
+
+    def __init__(self, lexer, position:int, logger):
+        self.lexer = lexer
+        self.position = position
+        self.logger = logger
+
+    def __call__(self):
+        with lekvar.State.ioSource(self.lexer.source):
+            parser = Parser(self.lexer, self.logger)
+            parser.reset(self.position)
+            return parser.parseBody([])
+
 class Parser:
     lexer = None
+    stream = None
+    position = 0
     tokens = None
     logger = None
+    lazy = False
 
-    def __init__(self, lexer, logger):
+    def __init__(self, lexer, logger, lazy = False):
         self.lexer = lexer
-        self.tokens = []
+        self.stream = lexer.stream
+        self.tokens = deque()
         self.logger = logger.getChild("Parser")
+        self.lazy = lazy
 
     @property
     def source(self): return self.lexer.source
 
+    # Return the token at an index of the token stream, lexing it if required
+    def _token(self, index):
+        if index < len(self.stream):
+            return self.stream[index]
+        return self.lexer.lex()
+
     # Return the next token and move forward by one token
     def next(self):
         if len(self.tokens) == 0:
-            return self.lexer.lex()
+            token = self._token(self.position)
         else:
-            return self.tokens.pop(0)
+            token = self.tokens.popleft()
+
+        if token is not None:
+            self.position += 1
+        return token
 
     # Look ahead of the current token by num tokens
     def lookAhead(self, num = 1):
         while len(self.tokens) < num:
-            self.tokens.append(self.lexer.lex())
+            self.tokens.append(self._token(self.position + len(self.tokens)))
         return self.tokens[num - 1]
 
+    # Mark the current position, for speculative parsing
+    def mark(self):
+        return self.position
+
+    # Return to a position previously marked
+    def reset(self, mark):
+        self.position = mark
+        self.tokens.clear()
+
     # Throw an unexpected token error
     def _unexpected(self, token):
         raise SyntaxError(message="Unexpected").add(content=token.data, tokens=[token], source=self.source)
@@ -128,13 +244,16 @@ class Parser:
         value = self.parseLine()
         if value is None: return None
 
-        if isinstance(value, lekvar.BoundObject) and (not isinstance(value, lekvar.BoundLink) or value.is_bound):
+        if self.isChild(value):
             self.addChild(children, value)
         else:
             instructions.append(value)
 
         return value
 
+    def isChild(self, value:lekvar.Object):
+        return isinstance(value, lekvar.BoundObject) and (not isinstance(value, lekvar.BoundLink) or value.is_bound)
+
     def addChild(self, children:{str: lekvar.BoundObject}, value:lekvar.BoundObject):
         name = value.name
 
@@ -175,6 +294,164 @@ class Parser:
 
         return lekvar.Module(module_name, list(children.values()), instructions, tokens)
 
+    # Parse the top level of a module, yielding each line as soon as it is parsed
+    def iterModule(self):
+        while True:
+            value = self.parseLine()
+            if value is None: return
+            yield value
+
+    # Parse the top level of a module into declarations, each with the names
+    # mentioned and assigned by it
+    def iterDeclarations(self):
+        start = self.position
+        values = self.iterModule()
+
+        while True:
+            with lekvar.State.ioSource(self.source):
+                value = next(values, None)
+            if value is None: return
+
+            # Imports may refer back to any name of the module
+            if Tokens.import_kwd in self.stream.types[start:self.position]:
+                mentions = None
+            else:
+                mentions = self.scanMentions(start, self.position)
+            assigns = self.scanDeclarations(start, self.position)[1]
+            yield lekvar.Declaration(value, self.isChild(value), mentions, assigns)
+
+            start = self.position
+
+    # Scan the whole source for the declarations of the module. The source is
+    # scanned separately from the token stream where possible, so that it is
+    # only lexed as it is parsed
+    def scanModule(self):
+        stream = None
+        if not self.lexer.chunked:
+            stream = scanSource(self.lexer.buffer, self.stream.encoding)
+
+        # Interactive sources, and those the lexer may reject, are lexed upfront
+        if stream is None:
+            while self.lexer.lex() is not None: pass
+            stream = self.stream
+
+        return self.scanDeclarations(0, len(stream), stream)
+
+    # Scan tokens for the names declared by module children, with the number
+    # of declarations of each, and the names assigned in the scope of the
+    # module. May return more names than are actually declared
+    def scanDeclarations(self, start:int, end:int, stream = None):
+        if stream is None:
+            stream = self.stream
+        types = stream.types
+        names = {}
+        assigned = set()
+
+        blocks = []
+        hard_blocks = 0
+
+        for index in range(start, end):
+            type = types[index]
+
+            if type in BLOCK_TOKENS:
+                if not blocks:
+                    name = self._declaredName(stream, index, end)
+                    if name is not None:
+                        names[name] = names.get(name, 0) + 1
+
+                blocks.append(type)
+                if type in HARD_BLOCK_TOKENS:
+                    hard_blocks += 1
+
+            elif type == Tokens.end_kwd:
+                if blocks and blocks.pop() in HARD_BLOCK_TOKENS:
+                    hard_blocks -= 1
+
+            elif type == Tokens.import_kwd and not blocks:
+                name = self._importedName(stream, index, end)
+                if name is not None:
+                    names[name] = names.get(name, 0) + 1
+
+            # Assignments to plain identifiers
+            elif (type == Tokens.assign and hard_blocks == 0 and index > start and
+                  types[index - 1] == Tokens.identifier and
+                  (index - 1 == start or types[index - 2] != Tokens.dot)):
+                assigned.add(stream.data(index - 1))
+
+        return names, assigned
+
+    # The name of the child declared by a block token, following parseMethod
+    def _declaredName(self, stream, index, end):
+        types = stream.types
+        type = types[index]
+
+        if type == Tokens.def_kwd:
+            if index + 2 >= end: return None
+
+            if types[index + 1] == Tokens.self_kwd:
+                return "" if types[index + 2] == Tokens.group_start else stream.data(index + 2)
+            elif types[index + 1] == Tokens.identifier or types[index + 2] == Tokens.self_kwd:
+                return stream.data(index + 1)
+        elif type in (Tokens.class_kwd, Tokens.module_kwd):
+            if index + 1 < end and types[index + 1] == Tokens.identifier:
+                return stream.data(index + 1)
+        return None
+
+    # The name of the child declared by an import, following parseImport
+    def _importedName(self, stream, index, end):
+        types = stream.types
+        name = None
+
+        for index in range(index + 1, end):
+            if types[index] == Tokens.identifier:
+                name = stream.data(index)
+            elif types[index] not in (Tokens.dot, Tokens.as_kwd):
+                break
+        return name
+
+    # Scan the whole source for the paths of all imports, as parseImportPath
+    # would parse them
+    def scanImports(self):
+        while self.lexer.lex() is not None: pass
+        types = self.stream.types
+        imports = []
+
+        for index, type in enumerate(types):
+            if type != Tokens.import_kwd: continue
+
+            path = []
+            index += 1
+            while index < len(types) and types[index] == Tokens.dot:
+                path.append("..")
+                index += 1
+
+            while index < len(types) and types[index] == Tokens.identifier:
+                path.append(self.stream.data(index))
+                if index + 1 < len(types) and types[index + 1] == Tokens.dot:
+                    index += 2
+                else:
+                    break
+
+            if path and path[-1] != "..":
+                imports.append(path)
+
+        return imports
+
+    # Scan tokens for all names they may refer to
+    def scanMentions(self, start, end):
+        types = self.stream.types
+        mentions = set()
+
+        for index in range(start, end):
+            type = types[index]
+
+            if type == Tokens.identifier:
+                mentions.add(self.stream.data(index))
+            elif type in IMPLICIT_MENTIONS:
+                mentions.add(IMPLICIT_MENTIONS[type])
+
+        return mentions
+
     def parseLine(self):
         # Parse a line. The line may not exist
 
@@ -199,80 +476,47 @@ class Parser:
         return value
 
     def parseValue(self, allow_assign = False):
-        values = [self.parseUnaryOperation()]
-        operations = []
+        precedences = ASSIGNMENT_PRECEDENCES if allow_assign else BINARY_OPERATION_PRECEDENCES
 
-        binary_operation_tokens = BINARY_OPERATION_TOKENS
-        if allow_assign:
-            binary_operation_tokens = {Tokens.assign} | binary_operation_tokens
+        return self.parseBinaryOperation(self.parseUnaryOperation(), 0, precedences)
 
+    # Parse binary operations following lhs through precedence climbing.
+    # Only operations binding at least as tight as min_precedence are parsed.
+    # All operations are left associative.
+    def parseBinaryOperation(self, lhs, min_precedence, precedences):
         while True:
             token = self.lookAhead()
+            if token is None: return lhs
 
-            if token and token.type in binary_operation_tokens:
-                operations.append(self.next())
-                values.append(self.parseUnaryOperation())
-            else:
-                break
+            precedence = precedences.get(token.type, -1)
+            if precedence < min_precedence: return lhs
 
-        return self.parseBinaryOperation(values, operations, allow_assign = allow_assign)
-
-    def parseBinaryOperation(self, values, operations, operation_index = 0, allow_assign = False):
-        if len(values) == 1:
-            return values[0]
-
-        binary_operations = BINARY_OPERATIONS
-        if allow_assign:
-            binary_operations = [{Tokens.assign}] + binary_operations
-
-        if operation_index == len(binary_operations):
-            raise InternalError("Unparsed operation {}".format(values))
-
-        # Accumulate values from higher order operations
-        # Separated by current order operations
-        operation_values = []
-        operation_operations = []
-
-        previous_index = 0
-        for index, operation in enumerate(operations):
-            if operation.type in binary_operations[operation_index]:
-                operation_operations.append(operation)
-
-                operation_values.append(self.parseBinaryOperation(
-                    values[previous_index:index + 1],
-                    operations[previous_index:index],
-                    operation_index + 1,
-                    allow_assign,
-                ))
-                previous_index = index + 1
-        operation_values.append(self.parseBinaryOperation(
-            values[previous_index:],
-            operations[previous_index:],
-            operation_index + 1,
-            allow_assign,
-        ))
-
-        # Accumulate operations (left to right)
-        lhs = operation_values[0]
-        for index, operation in enumerate(operation_operations):
-            rhs = operation_values[index + 1]
-
-            # Specialcases
-            if operation.type == Tokens.assign:
-                lhs = lekvar.Assignment(lhs, rhs, [operation])
-                continue
-            elif operation.type == Tokens.function:
-                raise InternalError("Not Implemented")
-                #TODO: Lambdas
-                lhs = anonymousFn(lhs, rhs, [operation])
+            operation = self.next()
+            rhs = self.parseUnaryOperation()
 
-            # Some operations are attributes of the lhs, others are global functions
-            if operation.type in BINARY_OPERATION_FUNCTIONS:
-                lhs = lekvar.Operation(lekvar.Identifier(BINARY_OPERATION_FUNCTIONS[operation.type]), [lhs, rhs], None, [operation])
-            else:
-                lhs = lekvar.Operation(lekvar.Attribute(lhs, operation.data), [rhs], None, [operation])
+            # Operations binding tighter take the rhs first
+            while True:
+                token = self.lookAhead()
+                if token is None or precedences.get(token.type, -1) <= precedence: break
 
-        return lhs
+                rhs = self.parseBinaryOperation(rhs, precedence + 1, precedences)
+
+            lhs = self.makeBinaryOperation(operation, lhs, rhs)
+
+    def makeBinaryOperation(self, operation, lhs, rhs):
+        # Specialcases
+        if operation.type == Tokens.assign:
+            return lekvar.Assignment(lhs, rhs, [operation])
+        elif operation.type == Tokens.function:
+            raise InternalError("Not Implemented")
+            #TODO: Lambdas
+            return anonymousFn(lhs, rhs, [operation])
+
+        # Some operations are attributes of the lhs, others are global functions
+        if operation.type in BINARY_OPERATION_FUNCTIONS:
+            return lekvar.Operation(lekvar.Identifier(BINARY_OPERATION_FUNCTIONS[operation.type]), [lhs, rhs], None, [operation])
+        else:
+            return lekvar.Operation(lekvar.Attribute(lhs, operation.data), [rhs], None, [operation])
 
     def parseUnaryOperation(self):
         # Collect prefix unary operations
@@ -386,41 +630,37 @@ class Parser:
 
         assert tokens[0].type == Tokens.integer
 
-        token = self.lookAhead()
-        token2 = self.lookAhead(2)
-
         # Float with dot in the middle
-        if token and token2 and token.type == Tokens.dot and token2.type == Tokens.integer:
-            tokens.append(self.next())
+        mark = self.mark()
+        dot, token = self.next(), self.next()
 
-            value = float(tokens[0].data.replace("_", "") + ".")
-
-            token = self.next()
-            tokens.append(token)
-
-            if token.type == Tokens.integer:
-                value += float("." + token.data.replace("_", ""))
-            else:
-                self._unexpected(token)
+        if dot and token and dot.type == Tokens.dot and token.type == Tokens.integer:
+            tokens += [dot, token]
 
+            value = float(tokens[0].data.replace("_", "") + ".")
+            value += float("." + token.data.replace("_", ""))
             return lekvar.Literal(value, lekvar.Identifier("Real"), tokens)
 
         # Integer
-        else:
-            value = int(tokens[0].data.replace("_", ""))
-            return lekvar.Literal(value, lekvar.Identifier("Int"), tokens)
+        self.reset(mark)
+
+        value = int(tokens[0].data.replace("_", ""))
+        return lekvar.Literal(value, lekvar.Identifier("Int"), tokens)
 
     def parseMethod(self):
         # starting keyword should have already been identified
         tokens = [self.next()]
         assert tokens[0].type == Tokens.def_kwd
 
-        # Parse different kinds of methods
+        # Parse different kinds of methods, determined by the start of the signature
+        mark = self.mark()
+        first, second = self.next(), self.next()
+        self.reset(mark)
 
         # Non cast operations
-        if self.lookAhead(2).type not in [Tokens.as_kwd, Tokens.typeof]:
+        if second.type not in [Tokens.as_kwd, Tokens.typeof]:
             # Operations with self on lhs
-            if self.lookAhead().type == Tokens.self_kwd:
+            if first.type == Tokens.self_kwd:
                 tokens.append(self.next())
 
                 token = self.lookAhead()
@@ -438,7 +678,7 @@ class Parser:
                 else:
                     raise SyntaxError(content=token.data, tokens=[token], source=self.source).add(message="is not a valid operation")
             # Prefix Unary Operations
-            elif self.lookAhead(2).type == Tokens.self_kwd:
+            elif second.type == Tokens.self_kwd:
                 token = self.next()
                 if token.type not in UNARY_OPERATION_TOKENS:
                     raise SyntaxError(content=token.data, tokens=[token], source=self.source).add(message="is not a valid operation")
@@ -488,23 +728,16 @@ class Parser:
         return self.parseMethodBody(name, arguments, default_values, None, tokens)
 
     def parseMethodBody(self, name, arguments, default_values, return_type, tokens):
-        # Parse instructions
-        instructions = []
-        children = {}
-
-        while True:
-            token = self.strip()
-
-            if token is None:
-                raise SyntaxError(message="Expected `end` before EOF").add(tokens=tokens, source=self.source)
+        # Default argument overloads share the children of the body, so those
+        # methods are always parsed directly
+        if self.lazy and all(value is None for value in default_values):
+            body = LazyBody(self.lexer, self.skipBody(tokens), self.logger.parent)
+            return lekvar.Method(name, [lekvar.Function("", arguments, None, [], return_type, tokens, body)])
 
-            if token.type == Tokens.end_kwd:
-                tokens.append(self.next())
-                break
-            self.parseInstructionOrChild(instructions, children)
+        instructions, children = self.parseBody(tokens)
 
         # Create method with default arguments
-        overloads = [lekvar.Function("", arguments, instructions, list(children.values()), return_type, tokens)]
+        overloads = [lekvar.Function("", arguments, instructions, children, return_type, tokens)]
 
         in_defaults = True
         for index, value in enumerate(reversed(default_values)):
@@ -524,7 +757,7 @@ class Parser:
                                 # Add non-default arguments with the default value
                                 args + [default_values[index]],
                             )
-                        ], list(children.values()), return_type, tokens)
+                        ], children, return_type, tokens)
                     )
             else:
                 # Check for default arguments before a non-defaulted argument
@@ -533,6 +766,44 @@ class Parser:
 
         return lekvar.Method(name, overloads)
 
+    # Parse the instructions and children of a body up to its end keyword
+    def parseBody(self, tokens):
+        instructions = []
+        children = {}
+
+        while True:
+            token = self.strip()
+
+            if token is None:
+                raise SyntaxError(message="Expected `end` before EOF").add(tokens=tokens, source=self.source)
+
+            if token.type == Tokens.end_kwd:
+                tokens.append(self.next())
+                break
+            self.parseInstructionOrChild(instructions, children)
+
+        return instructions, list(children.values())
+
+    # Skip a body up to its end keyword, matching the keywords of nested blocks
+    # without parsing them. Returns the position of the start of the body
+    def skipBody(self, tokens):
+        start = self.mark()
+        depth = 0
+
+        while True:
+            token = self.next()
+
+            if token is None:
+                raise SyntaxError(message="Expected `end` before EOF").add(tokens=tokens, source=self.source)
+
+            if token.type in BLOCK_TOKENS:
+                depth += 1
+            elif token.type == Tokens.end_kwd:
+                if depth == 0:
+                    tokens.append(token)
+                    return start
+                depth -= 1
+
     def parseMethodArguments(self):
         arguments, default_values = [], []
 
@@ -2,7 +2,6 @@ from contextlib import contextmanager, ExitStack
 
 from .. import errors
 from .. import lekvar
-from .. import interpreter
 
 class Pragma(lekvar.BoundLink):
     has_run = False
@@ -20,6 +19,9 @@ class Pragma(lekvar.BoundLink):
         return self.value.resolveValue()
 
     def _run(self):
+        # The interpreter is only imported once a pragma is run
+        from .. import interpreter
+
         interpreter.State.stdout = None
         with lekvar.useBackend(interpreter):
             self.value = self.value.eval()
@@ -0,0 +1,81 @@
+import os
+
+# Imports are resolved relative to the directory of the importing file first,
+# then in the library directories, and then in the directories of JAM_PATH.
+#
+# Directories are listed at most once while verifying a program, so resolving
+# an import is a dict lookup instead of probing the filesystem for every
+# candidate path.
+
+SEARCH_PATH_VARIABLE = "JAM_PATH"
+
+EXTENSION = ".jm"
+
+# Library directories, as given on the command line
+lib_dirs = []
+
+class SearchPath:
+    roots = None
+    listings = None
+
+    def __init__(self, roots:[str] = None):
+        if roots is None:
+            roots = lib_dirs + environmentRoots()
+        self.roots = roots
+        self.listings = {}
+
+    # Find the file for an import path, searching a directory before the roots.
+    # Returns the path of the file, and how many parts of the import path it
+    # covers, or None if there is no file
+    def find(self, directory:str, path:[str]):
+        for root in [directory] + self.roots:
+            found = self.findIn(root, path)
+            if found is not None:
+                return found
+        return None
+
+    def findIn(self, root:str, path:[str]):
+        directory = root
+        for index, name in enumerate(path):
+            # Leading dots of relative imports refer to parent directories
+            if name == os.pardir:
+                directory = os.path.join(directory, name)
+                continue
+
+            files, directories = self.listing(directory)
+
+            if name in files:
+                return os.path.join(directory, name + EXTENSION), index + 1
+            if name not in directories:
+                return None
+            directory = os.path.join(directory, name)
+        return None
+
+    # The names of the source files and subdirectories of a directory
+    def listing(self, directory:str):
+        key = os.path.normpath(directory)
+        if key not in self.listings:
+            self.listings[key] = self._list(key)
+        return self.listings[key]
+
+    def _list(self, directory:str):
+        files, directories = set(), set()
+
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            return files, directories
+
+        for name in names:
+            path = os.path.join(directory, name)
+            if name.endswith(EXTENSION) and os.path.isfile(path):
+                files.add(name[:-len(EXTENSION)])
+            elif os.path.isdir(path):
+                directories.add(name)
+
+        return files, directories
+
+# The directories of the JAM_PATH environment variable
+def environmentRoots():
+    value = os.environ.get(SEARCH_PATH_VARIABLE, "")
+    return [root for root in value.split(os.pathsep) if root]
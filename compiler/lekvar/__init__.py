@@ -10,9 +10,9 @@ from .closure import Closure, ClosedLink, ClosedTarget
 from .function import Function, FunctionType, FunctionInstance, Return
 from .external_function import ExternalFunction
 from .call import Call
-from .method import Method, MethodType, MethodInstance
+from .method import Method, MethodType, MethodInstance, OverloadIndex
 from .links import Link, BoundLink, ContextLink, Attribute
-from .identifier import Identifier
+from .identifier import Identifier, resolveSymbol
 from .modifiers import Constant, Reference
 from .variable import Variable
 from .assignment import Assignment
@@ -22,11 +22,17 @@ from .literal import Literal
 from .branches import Loop, Break, Branch
 from .void_type import VoidType
 from .size_of import SizeOf
+from .stream import Declaration, ModuleStream, StreamVerifier
+from .overlay import Overlay, session, share
 from . import stats
 from . import util
 from . import forward
 
-def _verify(source, frontend, logger = logging.getLogger()):
+def _verify(source, frontend, logger = logging.getLogger(), stream = False):
+    if stream:
+        logger.info("Parsing and Verifying")
+        return verifyStream(frontend.stream(source, logger), logger)
+
     logger.info("Parsing")
     module = frontend.parse(source, logger)
 
@@ -35,14 +41,14 @@ def _verify(source, frontend, logger = logging.getLogger()):
 
     return module
 
-def compile(source, frontend, backend, logger = logging.getLogger(), opt_level = 0):
-    module = _verify(source, frontend, logger)
+def compile(source, frontend, backend, logger = logging.getLogger(), opt_level = 0, stream = False):
+    module = _verify(source, frontend, logger, stream)
 
     logger.info("Generating Code")
     return backend.emit(module, logger, opt_level)
 
-def run(source, frontend, backend, logger = logging.getLogger(), opt_level = 0):
-    module = _verify(source, frontend, logger)
+def run(source, frontend, backend, logger = logging.getLogger(), opt_level = 0, stream = False):
+    module = _verify(source, frontend, logger, stream)
 
     logger.info("Running")
     return backend.run(module)
@@ -59,23 +65,71 @@ def verify(module:Module, logger = logging.getLogger()):
         e.format()
         raise e
 
+    logStatistics()
+
+# Verify the declarations of a verified module which were deferred until they
+# are used, for when the module is used as a whole
+def verifyDeferred(module:Module):
+    try:
+        module.verifyDeferred()
+    except CompilerError as e:
+        e.format()
+        raise e
+
+# Verify a module while it is streamed from the frontend, overlapping parsing
+# with verification
+def verifyStream(stream:ModuleStream, logger = logging.getLogger()):
+    State.init(logger.getChild("lekvar"))
+
+    try:
+        StreamVerifier(stream).verify()
+    except CompilerError as e:
+        e.format()
+        raise e
+
+    logStatistics()
+
+    return stream.module
+
+# Log how well the caches of the verifier were used
+def logStatistics():
+    State.logger.info("Compatibility cache: {hits} hits, {misses} misses, {uncached} uncached".format(**State.compatibility_stats))
+
 @contextmanager
 def use(frontend, backend, logger = logging.getLogger()):
     with useFrontend(frontend, logger), useBackend(backend, logger):
         yield
 
-@contextmanager
-def useFrontend(frontend, logger = logging.getLogger()):
-    builtins = frontend.builtins(logger)
+# Verify a frontend's builtins module. Frontends may return builtins which have
+# already been verified
+def verifyBuiltins(builtins:Module, logger = logging.getLogger()):
     # Hack backend into frontend builtins
     builtins.context.addChild(ForwardObject(builtins, "_builtins"))
 
     try:
         old_builtins = State.builtins
         State.builtins = builtins
-        verify(builtins)
+        verify(builtins, logger)
+    finally:
+        State.builtins = old_builtins
 
-        yield
+# Frontends may return shared builtins, which are used through the overlay of
+# the session instead of being copied
+@contextmanager
+def useFrontend(frontend, logger = logging.getLogger()):
+    builtins = frontend.builtins(logger)
+
+    try:
+        old_builtins = State.builtins
+        with session():
+            if builtins.verified:
+                # Leave the state as verification would have
+                State.init(logging.getLogger().getChild("lekvar"))
+            else:
+                verifyBuiltins(builtins)
+            State.builtins = builtins
+
+            yield
     finally:
         State.builtins = old_builtins
 
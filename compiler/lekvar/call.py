@@ -35,7 +35,7 @@ class Call(Object):
                 raise TypeError(message="Cannot pass non value:").add(object=value).add(message="as an argument")
             arg_types.append(value_type)
 
-        self.function_type = FunctionType(arg_types, self.return_type)
+        self.function_type = FunctionType.intern(arg_types, self.return_type)
         self.function_type.verify()
 
         # Resolve the call
@@ -29,6 +29,7 @@ class Class(Type, Closure):
                 self.constructor.overload_context[name] = Constructor(overload, self)
                 self.constructor.overload_context[name].bound_context = self.constructor.overload_context
                 self.constructor.overload_context[name].closed_context.addChild(Variable("self", self))
+            State.changeSignatures()
             self.instance_context.fakeChild(self.constructor)
 
         for child in self.instance_context:
@@ -86,6 +87,9 @@ class Class(Type, Closure):
     def local_context(self):
         return self.instance_context
 
+    def resolveTypeKey(self):
+        return self
+
     def checkCompatibility(self, other:Type, check_cache = None) -> bool:
         return other.resolveValue() == self
 
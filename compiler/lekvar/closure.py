@@ -2,6 +2,7 @@ from contextlib import contextmanager, ExitStack
 
 from .core import Object, Context, BoundObject, SoftScope, Scope
 from .links import Link, BoundLink, ContextLink
+from . import forward
 
 class Closure(Scope):
     closed_context = None
@@ -46,13 +47,13 @@ class ClosedTarget(Link):
 
     @contextmanager
     def target(self):
-        stack = ExitStack()
-
-        for target, value in self.targets:
-            stack.enter_context(target.resolveValue().targetValue(value))
-
-        with stack:
+        mark = len(forward.trail)
+        try:
+            for target, value in self.targets:
+                target.resolveValue().targetValue(value)
             yield
+        finally:
+            forward.undo(mark)
 
     def retarget(self, value:Object):
         return ClosedTarget(value, self.targets, self.value)
@@ -100,6 +101,9 @@ class ClosedTarget(Link):
     def resolveValue(self):
         return self
 
+    def resolveTypeKey(self):
+        return None
+
 class ClosedTargetContext(ContextLink):
     targeter = None
 
@@ -35,12 +35,16 @@ class Context:
     # Doubly link a child to the context
     def addChild(self, child):
         self.children[child.name] = child
+        State.changeName(child.name)
         self.fakeChild(child)
 
     # Bind the child to the context, but not the context to the child
     # Useful for setting up "parenting" for internal objects
     def fakeChild(self, child):
         assert hasattr(child, "bound_context")
+        # Moving a bound child changes what identifiers within it resolve to
+        if child.bound_context is not None and child.bound_context is not self:
+            State.changeScopes()
         child.bound_context = self
 
     def __contains__(self, name:str):
@@ -51,6 +55,7 @@ class Context:
 
     def __setitem__(self, name:str, value:BoundObject):
         self.children[name] = value
+        State.changeName(name)
 
     # Iterate through the children (not their names)
     def __iter__(self):
@@ -98,6 +103,12 @@ class Object(ABC):
     def extractValue(self) -> Object:
         return self
 
+    # Resolve a key identifying this object as a fixed type, or None if it
+    # isn't one. The compatibility of fixed types only depends on their keys,
+    # so it doesn't change while forward objects are targeted.
+    def resolveTypeKey(self):
+        return None
+
     # Resolves a call operation using this object's type.
     # May be overridden for more specific behaviour
     def resolveCall(self, call:FunctionType) -> Function:
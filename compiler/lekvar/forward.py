@@ -1,4 +1,5 @@
-from contextlib import contextmanager, ExitStack
+from contextlib import contextmanager
+from collections import deque
 from itertools import chain
 
 from ..errors import *
@@ -12,21 +13,54 @@ from .links import Link
 # Python Predefines
 ForwardObject = None
 
+#
+# Targeting
+#
+# Targeting binds forward objects to their targets for as long as they are
+# targeted. Every binding is recorded on the trail with the value it replaced,
+# so leaving a target undoes the trail back to the mark it started at.
+# Dependencies of bound objects are targeted in order from a flat worklist.
+
+# The bindings of all current targets, as (object, attribute, previous value)
+trail = []
+
+# Marks the end of an iterator of dependencies
+END = object()
+
+# Set an attribute of an object, recording its previous value on the trail
+def assign(object:Object, name:str, value):
+    trail.append((object, name, getattr(object, name)))
+    setattr(object, name, value)
+
+# Undo all bindings recorded on the trail since a mark
+def undo(mark:int):
+    while len(trail) > mark:
+        object, name, value = trail.pop()
+        setattr(object, name, value)
+
+# Bind a set of forward objects and their dependencies to their targets. The
+# bindings stay on the trail until they are undone
+def bind(objects:[(ForwardObject, Object)], checkTypes = True):
+    pending = deque([iter(objects)])
+    while pending:
+        dep = next(pending[0], END)
+        if dep is END:
+            pending.popleft()
+            continue
+        if dep is None: continue
+
+        object, target = dep
+        pending.append(iter(object.targetAt(target, checkTypes)))
+
 # Apply targeting to a set of forward objects and their dependencies
 @contextmanager
 def target(objects:[(ForwardObject, Object)], checkTypes = True):
-    with ExitStack() as stack:
-        dependencies = iter(objects)
-        while True:
-            dep = next(dependencies, 0)
-            if dep is 0: break
-            if dep is None: continue
-
-            object, target = dep
-            next_dependencies = object.targetAt(target, checkTypes)
-            dependencies = chain(dependencies, stack.enter_context(next_dependencies))
-
+    mark = len(trail)
+    try:
+        bind(objects, checkTypes)
         yield
+    finally:
+        undo(mark)
 
 # A forward object is a collector for behaviour
 # Initially the object is used like any other, creating dependencies
@@ -103,8 +137,7 @@ class ForwardObject(Type, BoundObject):
             return self
         return self.target
 
-    # Targets this forward object
-    @contextmanager
+    # Targets this forward object, returning the dependencies to target with it
     def targetAt(self, target, checkTypes = True):
         if isinstance(target, ForwardObject):
             target = target.resolveValue()
@@ -114,49 +147,45 @@ class ForwardObject(Type, BoundObject):
         # Escape recursion
         if self.target is not None:
             if self.target is target:
-                yield []
-                return
+                return ()
 
             #TODO: There should be a safer way to handle this
 
         # Escape more recursion
         if target is self:
-            yield []
-            return
+            return ()
 
         # Local checks
         if checkTypes and not self.checkLockedCompatibility(target):
             raise TypeError(message="TODO: Write this")
 
-        # Pass on dependency checks
-        def target_generator():
-            if self._context is not None:
-                yield self.context, target.context
+        assign(self, "target", target)
+        return self._targetDependencies(target)
 
-            if self._instance_context is not None:
-                yield self.instance_context, target.instance_context
+    # Pass on dependency checks
+    def _targetDependencies(self, target):
+        if self._context is not None:
+            yield self.context, target.context
 
-            if self.resolved_type is not None:
-                yield self.resolved_type, target.resolveType()
+        if self._instance_context is not None:
+            yield self.instance_context, target.instance_context
 
-            calls = self._targetCall(target, self.resolved_calls, lambda c: c.resolveCall)
-            inst_calls = self._targetCall(target, self.resolved_instance_calls, lambda o: o.resolveInstanceCall)
-            for o in chain(calls, inst_calls):
-                yield o
+        if self.resolved_type is not None:
+            yield self.resolved_type, target.resolveType()
 
-            for switch in self.switches:
-                yield switch.resolveTarget()
+        calls = self._targetCall(target, self.resolved_calls, lambda c: c.resolveCall)
+        inst_calls = self._targetCall(target, self.resolved_instance_calls, lambda o: o.resolveInstanceCall)
+        for o in chain(calls, inst_calls):
+            yield o
 
-            if self._return_type is not None:
-                # Should fail compatibility checks if not true
-                assert hasattr(target, "return_type")
+        for switch in self.switches:
+            yield switch.resolveTarget()
 
-                yield self._return_type, target.return_type
+        if self._return_type is not None:
+            # Should fail compatibility checks if not true
+            assert hasattr(target, "return_type")
 
-        previous_target = self.target
-        self.target = target
-        yield target_generator()
-        self.target = previous_target
+            yield self._return_type, target.return_type
 
     def _targetCall(self, target, calls, resolution_function):
         for call, obj in calls.items():
@@ -317,17 +346,14 @@ class ForwardContext(Context):
     def locked(self):
         return self.scope.locked
 
-    @contextmanager
     def targetAt(self, target, checkTypes = True):
-        def target_generator():
-            if isinstance(target, ForwardContext) and self.scope.scope is target.scope.scope:
-                target.scope._instance_context = self
-                yield None
-                return
-
-            for name in self.children:
-                if name not in target.children:
-                    raise (DependencyError(message="Forward target context does not have attribute")
-                           .add(content=name).add(message="", object=target.scope))
-                yield self[name], target[name]
-        yield target_generator()
+        if isinstance(target, ForwardContext) and self.scope.scope is target.scope.scope:
+            target.scope._instance_context = self
+            yield None
+            return
+
+        for name in self.children:
+            if name not in target.children:
+                raise (DependencyError(message="Forward target context does not have attribute")
+                       .add(content=name).add(message="", object=target.scope))
+            yield self[name], target[name]
@@ -19,20 +19,24 @@ class Function(Closure):
     local_context = None
 
     arguments = None
-    instructions = None
+    _instructions = None
+    # A callable returning the instructions and children of a lazily parsed
+    # function, loaded when the instructions are first needed
+    body = None
 
     type = None
     verified = False
 
     forward_target_cache = None
 
-    def __init__(self, name:str, arguments:[Variable], instructions:[Object], children:[Object] = [], return_type:Type = None, tokens = None):
+    def __init__(self, name:str, arguments:[Variable], instructions:[Object], children:[Object] = [], return_type:Type = None, tokens = None, body = None):
         Closure.__init__(self, name, tokens)
 
         self.local_context = Context(self, arguments + children)
 
         self.arguments = arguments
         self.instructions = instructions
+        self.body = body
 
         for arg in self.arguments:
             if arg.resolveType() is None:
@@ -42,6 +46,21 @@ class Function(Closure):
 
         self.forward_target_cache = {}
 
+    @property
+    def instructions(self):
+        if self.body is not None:
+            body, self.body = self.body, None
+
+            self._instructions, children = body()
+            for child in children:
+                self.local_context.addChild(child)
+
+        return self._instructions
+
+    @instructions.setter
+    def instructions(self, instructions:[Object]):
+        self._instructions = instructions
+
     def verify(self):
         if self.verified: return
         self.verified = True
@@ -105,18 +124,48 @@ class FunctionType(Type):
     return_type = None
 
     verified = False
+    # The hash of interned types, which never change
+    interned_hash = None
 
     def __init__(self, arguments:[Type], return_type:Type = None, tokens = None):
         Type.__init__(self, tokens)
         self.arguments = arguments
         self.return_type = return_type
 
+    # Create a function type, reusing the interned one if it is fixed.
+    # Structurally identical fixed types are interned for the verification,
+    # so that they compare by identity and hash once. Interned types must not
+    # be changed, unlike the types of functions whose return type is inferred
+    @classmethod
+    def intern(cls, arguments:[Type], return_type:Type = None):
+        type = cls(arguments, return_type)
+        if State.function_types is None:
+            return type
+
+        key = type._resolveTypeKey()
+        if key is None:
+            return type
+
+        if key not in State.function_types:
+            type.interned_hash = hash(tuple(arguments))
+            State.function_types[key] = type
+        return State.function_types[key]
+
     def __eq__(self, other):
         return self.checkCompatibility(other)
 
     def __hash__(self):
+        if self.interned_hash is not None:
+            return self.interned_hash
         return hash(tuple(self.arguments))
 
+    # The hash of interned types depends on the identity of their arguments,
+    # so it isn't kept by copies and pickles
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state.pop("interned_hash", None)
+        return state
+
     def verify(self):
         if self.verified: return
         self.verified = True
@@ -146,14 +195,73 @@ class FunctionType(Type):
     def local_context(self):
         raise InternalError("Not Implemented")
 
+    # Function types are fixed once all of their arguments and return type are.
+    # Their keys are structural, so that the types of separate calls share them.
+    # Keys are kept for the verification, until a return type is inferred
+    def resolveTypeKey(self):
+        keys = State.type_keys
+        if keys is None:
+            return self._resolveTypeKey()
+
+        entry = keys.get(id(self))
+        if entry is not None:
+            return entry[1]
+
+        key = self._resolveTypeKey()
+        if key is not None:
+            # Entries keep their type alive, so that its id is not reused
+            keys[id(self)] = self, key
+        return key
+
+    def _resolveTypeKey(self):
+        arguments = tuple(argument.resolveTypeKey() for argument in self.arguments)
+        if None in arguments:
+            return None
+
+        if self.return_type is None:
+            return arguments, ()
+
+        return_type = self.return_type.resolveTypeKey()
+        if return_type is None:
+            return None
+        return arguments, return_type
+
     def resolveInstanceCall(self, call):
         if not checkCompatibility(self, call):
             raise TypeError(object=self).add(message="is not callable with").add(object=call)
         return FunctionInstance(self)
 
+    # Compatibility between fixed function types is cached for the
+    # verification. Other function types are always checked, as their forward
+    # arguments may change while they are targeted. Types with less than two
+    # arguments are checked faster than they are looked up
     def checkCompatibility(self, other:Type, check_cache = None):
         other = other.resolveValue()
-
+        keys = State.type_keys
+        if keys is None or len(self.arguments) < 2 or not isinstance(other, FunctionType):
+            return self._checkCompatibility(other, check_cache)
+
+        # Look up the keys of the types directly, as this is the common case
+        self_entry, other_entry = keys.get(id(self)), keys.get(id(other))
+        self_key = self.resolveTypeKey() if self_entry is None else self_entry[1]
+        other_key = other.resolveTypeKey() if other_entry is None else other_entry[1]
+
+        stats = State.compatibility_stats
+        if self_key is None or other_key is None:
+            stats["uncached"] += 1
+            return self._checkCompatibility(other, check_cache)
+
+        key = self_key, other_key
+        result = State.compatibility_cache.get(key)
+        if result is not None:
+            stats["hits"] += 1
+            return result
+
+        stats["misses"] += 1
+        result = State.compatibility_cache[key] = self._checkCompatibility(other, check_cache)
+        return result
+
+    def _checkCompatibility(self, other:Type, check_cache = None):
         if isinstance(other, FunctionType):
             if len(self.arguments) != len(other.arguments):
                 return False
@@ -217,6 +325,8 @@ class Return(Object):
                 except TypeError:
                     return_type = None
                 self.function.type.return_type = return_type
+                # Keys of types including the function type have changed
+                State.changeSignatures()
         # Check function types
             elif not checkCompatibility(self.value.resolveType(), self.function.type.return_type):
                 raise TypeError(object=self).add(message="return type is not compatible with").add(object=self.function.type.return_type)
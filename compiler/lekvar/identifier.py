@@ -1,10 +1,43 @@
 from ..errors import *
 
 from .state import State
+from .core import BoundObject
 from .links import BoundLink
 from .variable import Variable
 from .assignment import InferVariable
 
+# Resolve a name within a scope, through the symbol table of the scope. Tables
+# hold what names resolve to in all enclosing scopes and the builtins, so
+# resolving a name again is a single lookup
+def resolveSymbol(scope:BoundObject, name:str):
+    if State.symbol_tables is None:
+        return _resolveSymbol(scope, name)
+
+    # Tables keep their scope alive, so that its id is not reused
+    entry = State.symbol_tables.get(id(scope))
+    if entry is None:
+        entry = State.symbol_tables[id(scope)] = scope, {}
+    table = entry[1]
+
+    if name in table:
+        generation, found = table[name]
+        if generation >= State.scope_generation and generation >= State.name_generations.get(name, 0):
+            return set(found)
+
+    # Resolving may change the scopes, such as closures capturing the match
+    generation = State.generation
+    found = _resolveSymbol(scope, name)
+    table[name] = generation, found
+    return set(found)
+
+def _resolveSymbol(scope:BoundObject, name:str):
+    # Use sets to ignore duplicate entries
+    #TODO: Fix duplicate entries
+    found = set(scope.resolveIdentifier(name))
+    if State.builtins is not None:
+        found |= set(State.builtins.resolveIdentifier(name))
+    return found
+
 class Identifier(BoundLink):
     name = None
 
@@ -13,11 +46,7 @@ class Identifier(BoundLink):
         self.name = name
 
     def _resolveIdentifier(self):
-        # Use sets to ignore duplicate entries
-        #TODO: Fix duplicate entries
-        found = set(State.scope.resolveIdentifier(self.name))
-        if State.builtins is not None:
-            found |= set(State.builtins.resolveIdentifier(self.name))
+        found = resolveSymbol(State.scope, self.name)
 
         if len(found) > 1:
             err = AmbiguityError(message="Ambiguous reference to").add(content=self.name, object=self).addNote(message="Matches:")
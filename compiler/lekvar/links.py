@@ -44,6 +44,11 @@ class Link(Type):
     def extractValue(self):
         return self.value.extractValue()
 
+    def resolveTypeKey(self):
+        if self.value is None:
+            return None
+        return self.value.resolveTypeKey()
+
     def checkCompatibility(self, other:Type, check_cache = None):
         return self.value.checkCompatibility(other, check_cache)
 
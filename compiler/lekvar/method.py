@@ -6,6 +6,7 @@ from .core import Context, Object, BoundObject, SoftScope, Scope, Type
 from .util import checkCompatibility
 from .function import Function, FunctionType
 from .forward import ForwardObject, ForwardTarget
+from .void_type import VoidType
 
 # Python Predefines
 Method = None
@@ -25,6 +26,7 @@ class Method(Scope):
     def addOverload(self, overload:Function):
         overload.name = str(len(self.overload_context))
         self.overload_context.addChild(overload)
+        State.changeSignatures()
 
     # Pre-verification method
     def assimilate(self, other:Method):
@@ -40,15 +42,40 @@ class Method(Scope):
         with State.scoped(self):
             self.overload_context.verify()
 
+    # Whether none of the overloads have been parsed yet
+    @property
+    def deferred(self):
+        overloads = list(self.overload_context)
+        return len(overloads) > 0 and all(isinstance(overload, Function) and overload.body is not None
+                                          for overload in overloads)
+
     def resolveType(self):
         return MethodType([fn.resolveType() for fn in self.overload_context])
 
+    # The index of the overloads, built once all of them are verified
+    def overloadIndex(self):
+        index = OverloadIndex.get(self)
+        if index is None:
+            for overload in self.overload_context:
+                overload.verify()
+
+            overloads = list(self.overload_context)
+            index = OverloadIndex(overloads, [overload.resolveType() for overload in overloads])
+            OverloadIndex.set(self, index)
+        return index
+
     def resolveCall(self, call:FunctionType):
+        index = self.overloadIndex()
+
+        key = index.signatureKey(call)
+        if key in index.resolved:
+            return index.resolved[key]
+
         matches = []
 
         # Collect overloads which match the call type
-        for overload in self.overload_context:
-            overload.verify()
+        candidates, fixed = index.candidates(call)
+        for overload in candidates:
             if checkCompatibility(call, overload.resolveType()):
                 matches.append(overload)
 
@@ -87,6 +114,9 @@ class Method(Scope):
                 err.addNote(object=match, message="")
             raise err
 
+        # The resolution of fixed signatures only depends on fixed types
+        if key is not None and fixed:
+            index.resolved[key] = normal_matches[0]
         return normal_matches[0]
 
     @property
@@ -146,9 +176,15 @@ class MethodType(Type):
         return True
 
     def resolveInstanceCall(self, call:FunctionType):
+        index = OverloadIndex.get(self)
+        if index is None:
+            index = OverloadIndex(self.overloads, self.overloads)
+            OverloadIndex.set(self, index)
+
         matches = []
 
-        for fn_type in self.overloads:
+        candidates, fixed = index.candidates(call)
+        for fn_type in candidates:
             if fn_type.checkCompatibility(call):
                 matches.append(fn_type)
 
@@ -193,3 +229,76 @@ class MethodInstance(Object):
 
     def __repr__(self):
         return "MethodInstance({})".format(self.resolveType())
+
+# Overloads are indexed by their arity and the class of their first argument,
+# so that calls only check the overloads they may match. The order of the
+# overloads is kept, so that the matches of a call stay the same.
+class OverloadIndex:
+    entries = None
+    generation = None
+    # Candidates for each arity and class of the first argument
+    buckets = None
+    # Resolved overloads for fixed call signatures
+    resolved = None
+
+    def __init__(self, overloads:[Object], types:[Type]):
+        self.entries = []
+        self.generation = State.signature_generation
+        self.buckets = {}
+        self.resolved = {}
+
+        for overload, type in zip(overloads, types):
+            type = type.resolveValue()
+            if isinstance(type, FunctionType):
+                arity, first = len(type.arguments), self.firstKey(type)
+            else:
+                # Anything else may match any call
+                arity, first = None, None
+            self.entries.append((arity, first, type.resolveTypeKey() is not None, overload))
+
+    # Indices are kept for the verification, by the object they index
+    @staticmethod
+    def get(object:Object):
+        if State.overload_indices is None:
+            return None
+
+        entry = State.overload_indices.get(id(object))
+        if entry is None or entry[1].generation != State.signature_generation:
+            return None
+        return entry[1]
+
+    @staticmethod
+    def set(object:Object, index:"OverloadIndex"):
+        # Entries keep their object alive, so that its id is not reused
+        if State.overload_indices is not None:
+            State.overload_indices[id(object)] = object, index
+
+    # The class of the first argument of a function type, or None if it may
+    # be compatible with more than one class
+    @staticmethod
+    def firstKey(type:FunctionType):
+        if len(type.arguments) == 0:
+            return None
+
+        key = type.arguments[0].resolveTypeKey()
+        if isinstance(key, tuple) or isinstance(key, VoidType):
+            return None
+        return key
+
+    # The key of a call, or None if its resolution may change
+    def signatureKey(self, call:FunctionType):
+        if call.return_type is not None:
+            return None
+        return call.resolveTypeKey()
+
+    # The overloads a call may match, and whether all of them are fixed
+    def candidates(self, call:FunctionType):
+        bucket = len(call.arguments), self.firstKey(call)
+        if bucket not in self.buckets:
+            arity, first = bucket
+            candidates = [entry for entry in self.entries
+                          if entry[0] is None or (entry[0] == arity and
+                             (entry[1] is None or first is None or entry[1] == first))]
+            self.buckets[bucket] = ([entry[3] for entry in candidates],
+                                    all(entry[2] for entry in candidates))
+        return self.buckets[bucket]
@@ -55,6 +55,9 @@ class Reference(BoundLink):
     def resolveValue(self):
         return self
 
+    def resolveTypeKey(self):
+        return None
+
     def resolveType(self):
         return Reference(self.value.resolveType())
 
@@ -4,6 +4,7 @@ from .state import State
 from .stats import ScopeStats
 from .core import Context, Object, BoundObject, Scope, Type
 from .function import Function
+from .method import Method
 
 class Module(Type, Scope):
     verified = False
@@ -28,6 +29,16 @@ class Module(Type, Scope):
             for instruction in self.main:
                 instruction.verify()
 
+            # Methods which haven't been parsed yet are only verified once
+            # they are used
+            for child in self.context:
+                if not (isinstance(child, Method) and child.deferred):
+                    child.verify()
+
+    # Verify the children deferred until they are used, for when the module is
+    # used as a whole
+    def verifyDeferred(self):
+        with State.scoped(self):
             self.context.verify()
 
     def resolveType(self):
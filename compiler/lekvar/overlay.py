@@ -0,0 +1,300 @@
+from contextlib import contextmanager
+
+from ..errors import *
+
+from .state import State
+from .core import Context, Object
+from .stats import Stats
+
+# Shared objects are verified once and reused by every session, instead of
+# being copied for each one. Anything a session changes on them is recorded in
+# the overlay of the session, and undone once the session ends. Outside of a
+# session shared objects are immutable.
+
+# Marks attributes which did not exist before they were changed
+MISSING = object()
+
+class Overlay:
+    attributes = None
+    containers = None
+
+    def __init__(self):
+        self.attributes = {}
+        self.containers = {}
+
+    # Record the value of an attribute before it is first changed
+    def record(self, object, name:str):
+        key = id(object), name
+        if key not in self.attributes:
+            self.attributes[key] = object, name, object.__dict__.get(name, MISSING)
+
+    # Record the contents of a container before it is first changed
+    def recordContainer(self, container):
+        if id(container) not in self.containers:
+            self.containers[id(container)] = container, container.contents()
+
+    # Undo all changes made to shared objects
+    def restore(self):
+        for object, name, value in self.attributes.values():
+            if value is MISSING:
+                object.__dict__.pop(name, None)
+            else:
+                object.__dict__[name] = value
+
+        for container, contents in self.containers.values():
+            container.restore(contents)
+
+        self.attributes = {}
+        self.containers = {}
+
+        # Restored contexts may resolve identifiers differently
+        State.changeScopes()
+
+# Create an overlay for the duration of a session
+@contextmanager
+def session():
+    previous_overlay = State.overlay
+    State.overlay = Overlay()
+    try:
+        yield State.overlay
+    finally:
+        State.overlay.restore()
+        State.overlay = previous_overlay
+
+def _overlay():
+    if State.overlay is None:
+        raise InternalError("Shared objects cannot be changed outside of a session")
+    return State.overlay
+
+#
+# Shared Objects
+#
+
+class Shared:
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        _overlay().record(self, name)
+        super().__setattr__(name, value)
+
+    def __delattr__(self, name):
+        _overlay().record(self, name)
+        super().__delattr__(name)
+
+    # Copies and pickles of shared objects are not shared
+    def __reduce_ex__(self, protocol):
+        function, arguments, *rest = super().__reduce_ex__(protocol)
+        return (function, (self.unshared,) + arguments[1:]) + tuple(rest)
+
+_shared_classes = {}
+
+# The shared variant of a class. Shared comes last, as objects can only change
+# to classes with the same layout
+def sharedClass(cls):
+    if cls not in _shared_classes:
+        shared = type(cls)(cls.__name__, (cls, Shared), {"__slots__": (), "unshared": cls})
+        shared.__qualname__ = cls.__qualname__
+        shared.__module__ = cls.__module__
+        _shared_classes[cls] = shared
+    return _shared_classes[cls]
+
+class SharedContainer:
+    __slots__ = ()
+
+    def record(self):
+        _overlay().recordContainer(self)
+
+    def __copy__(self):
+        return self.unshared(self)
+
+    def __reduce_ex__(self, protocol):
+        return self.unshared, (self.unshared(self),)
+
+class SharedDict(SharedContainer, dict):
+    unshared = dict
+
+    def __setitem__(self, key, value):
+        self.record()
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        self.record()
+        dict.__delitem__(self, key)
+
+    def setdefault(self, key, default = None):
+        if key not in self: self.record()
+        return dict.setdefault(self, key, default)
+
+    def pop(self, *args):
+        self.record()
+        return dict.pop(self, *args)
+
+    def popitem(self):
+        self.record()
+        return dict.popitem(self)
+
+    def update(self, *args, **kwargs):
+        self.record()
+        dict.update(self, *args, **kwargs)
+
+    def clear(self):
+        self.record()
+        dict.clear(self)
+
+    def contents(self):
+        return dict(self)
+
+    def restore(self, contents):
+        dict.clear(self)
+        dict.update(self, contents)
+
+class SharedList(SharedContainer, list):
+    unshared = list
+
+    def __setitem__(self, index, value):
+        self.record()
+        list.__setitem__(self, index, value)
+
+    def __delitem__(self, index):
+        self.record()
+        list.__delitem__(self, index)
+
+    def __iadd__(self, other):
+        self.record()
+        return list.__iadd__(self, other)
+
+    def append(self, value):
+        self.record()
+        list.append(self, value)
+
+    def extend(self, values):
+        self.record()
+        list.extend(self, values)
+
+    def insert(self, index, value):
+        self.record()
+        list.insert(self, index, value)
+
+    def pop(self, *args):
+        self.record()
+        return list.pop(self, *args)
+
+    def remove(self, value):
+        self.record()
+        list.remove(self, value)
+
+    def clear(self):
+        self.record()
+        list.clear(self)
+
+    def sort(self, *args, **kwargs):
+        self.record()
+        list.sort(self, *args, **kwargs)
+
+    def reverse(self):
+        self.record()
+        list.reverse(self)
+
+    def contents(self):
+        return list(self)
+
+    def restore(self, contents):
+        list.__setitem__(self, slice(None), contents)
+
+class SharedSet(SharedContainer, set):
+    unshared = set
+
+    def __ior__(self, other):
+        self.record()
+        return set.__ior__(self, other)
+
+    def add(self, value):
+        if value not in self: self.record()
+        set.add(self, value)
+
+    def discard(self, value):
+        self.record()
+        set.discard(self, value)
+
+    def remove(self, value):
+        self.record()
+        set.remove(self, value)
+
+    def pop(self):
+        self.record()
+        return set.pop(self)
+
+    def update(self, *others):
+        self.record()
+        set.update(self, *others)
+
+    def clear(self):
+        self.record()
+        set.clear(self)
+
+    def contents(self):
+        return set(self)
+
+    def restore(self, contents):
+        set.clear(self)
+        set.update(self, contents)
+
+SHARED_CONTAINERS = {
+    dict: SharedDict,
+    list: SharedList,
+    set: SharedSet,
+}
+
+# Share an object and everything it refers to, so that it can be used by
+# multiple sessions without being copied
+def share(root:Object):
+    shared = {}
+    objects = []
+
+    # Replace containers by their shared variants, keeping references intact
+    def replace(value):
+        if id(value) in shared:
+            return shared[id(value)]
+
+        cls = type(value)
+        if cls in SHARED_CONTAINERS:
+            result = SHARED_CONTAINERS[cls]()
+            shared[id(value)] = result
+
+            # Copy before replacing, so that keys aren't hashed again
+            if cls is dict:
+                dict.update(result, value)
+                for key, item in value.items():
+                    replace(key)
+                    item_result = replace(item)
+                    if item_result is not item:
+                        dict.__setitem__(result, key, item_result)
+            elif cls is list:
+                list.extend(result, map(replace, value))
+            else:
+                set.update(result, value)
+                for item in value:
+                    replace(item)
+        elif cls is tuple:
+            result = tuple(replace(item) for item in value)
+            shared[id(value)] = result
+        else:
+            result = value
+            shared[id(value)] = result
+
+            if isinstance(value, (Object, Context, Stats)) and not isinstance(value, Shared):
+                objects.append(value)
+
+        # Keep the original alive, so that its id is not reused
+        shared[id(value), None] = value
+        return result
+
+    replace(root)
+    while objects:
+        object = objects.pop()
+        attributes = object.__dict__
+        for name, value in attributes.items():
+            attributes[name] = replace(value)
+        object.__class__ = sharedClass(type(object))
+
+    return root
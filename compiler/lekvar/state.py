@@ -19,12 +19,37 @@ class classproperty:
 # The global state for the verifier
 class State:
     source = None
-    sources = None
+    # The modules imported by the frontend, and where it searches for them,
+    # while verifying
+    modules = None
+    search_path = None
     builtins = None
     logger = None
+    # The overlay of the current session over shared objects
+    overlay = None
 
     scope_stack = None
 
+    # Symbol tables of scopes, caching what identifiers resolve to within them.
+    # Entries record the generation they were built at, and are stale once
+    # their name, or the parent of any scope, changed after that
+    symbol_tables = None
+    generation = 0
+    name_generations = {}
+    scope_generation = 0
+
+    # Results of compatibility checks between fixed function types, and how
+    # often the cache was hit, missed or not used for other types
+    compatibility_cache = None
+    compatibility_stats = None
+    type_keys = None
+    # Indices of the overloads of methods and method types, which are stale
+    # once any signature changed after they were built
+    overload_indices = None
+    signature_generation = 0
+    # Interned function types by their keys
+    function_types = None
+
     # Other global state
     type_switching = False
 
@@ -32,7 +57,35 @@ class State:
     def init(cls, logger:logging.Logger):
         cls.logger = logger
         cls.scope_stack = []
-        cls.sources = None
+        cls.modules = None
+        cls.search_path = None
+        cls.symbol_tables = {}
+        cls.name_generations = {}
+        cls.compatibility_cache = {}
+        cls.compatibility_stats = {"hits": 0, "misses": 0, "uncached": 0}
+        cls.type_keys = {}
+        cls.overload_indices = {}
+        cls.function_types = {}
+
+    # Invalidate the symbol table entries of a name
+    @classmethod
+    def changeName(cls, name:str):
+        cls.generation += 1
+        cls.name_generations[name] = cls.generation
+
+    # Invalidate the keys of function types and the overload indices, once
+    # overloads are added or their signatures are resolved
+    @classmethod
+    def changeSignatures(cls):
+        cls.signature_generation += 1
+        if cls.type_keys is not None:
+            cls.type_keys.clear()
+
+    # Invalidate all symbol table entries
+    @classmethod
+    def changeScopes(cls):
+        cls.generation += 1
+        cls.scope_generation = cls.generation
 
     @classproperty
     def scope(cls):
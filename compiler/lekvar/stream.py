@@ -0,0 +1,204 @@
+from heapq import heappush, heappop
+
+from ..errors import *
+
+from .state import State
+from .stats import ScopeStats
+from .module import Module
+from .method import Method
+
+# A single top-level declaration of a module, as produced by a frontend.
+# Mentions are all the names the declaration may refer to, or None if it may
+# refer to any, assigns the names it may assign in the scope of the module.
+class Declaration:
+    value = None
+    child = False
+
+    mentions = None
+    assigns = None
+
+    index = None
+    verified = False
+
+    def __init__(self, value, child:bool, mentions:{str} or None, assigns:{str}):
+        self.value = value
+        self.child = child
+        self.mentions = mentions
+        self.assigns = assigns
+
+    def __repr__(self):
+        return "declaration {}".format(self.value)
+
+# The top level of a module, streamed from a frontend one declaration at a time.
+# Names counts how many children declare each name, assigned holds all names
+# which may be assigned in the scope of the module. Both must be known upfront,
+# so that the verifier knows whether a name may still be declared later.
+class ModuleStream:
+    module = None
+    declarations = None
+
+    names = None
+    assigned = None
+
+    def __init__(self, module:Module, declarations, names:{str: int}, assigned:{str}):
+        self.module = module
+        self.declarations = declarations
+        self.names = names
+        self.assigned = assigned
+
+# Verifies a module stream while it is being produced.
+#
+# A declaration is verified as soon as every module level name it mentions is
+# complete, and the declarations of those names could be verified as well.
+# Names are complete once all children declaring them have been produced, and
+# the first declaration assigning them has been verified. Declarations with
+# forward references wait for the names they need, and anything left at the end
+# of the stream is verified in the same order as Module.verify does.
+class StreamVerifier:
+    # Blocks declarations until the end of the stream
+    END = object()
+
+    stream = None
+    module = None
+
+    remaining = None
+    unassigned = None
+
+    children = None
+    instructions = None
+    assigners = None
+
+    waiting = None
+    queue = None
+
+    def __init__(self, stream:ModuleStream):
+        self.stream = stream
+        self.module = stream.module
+
+        self.remaining = dict(stream.names)
+        self.unassigned = set(stream.assigned)
+
+        self.children = {}
+        self.instructions = []
+        self.assigners = {}
+
+        self.waiting = {}
+        self.queue = []
+
+    def verify(self):
+        module = self.module
+        if module.verified: return
+        module.verified = True
+
+        module._stats = ScopeStats(module.parent)
+        if module.parent is None:
+            module.stats.static = True
+
+        with State.scoped(module):
+            for index, declaration in enumerate(self.stream.declarations):
+                declaration.index = index
+                self.declare(declaration)
+
+                self.schedule([declaration])
+                self.process()
+
+            # Verify everything that is left over
+            for declaration in self.instructions:
+                if not declaration.verified:
+                    declaration.verified = True
+                    declaration.value.verify()
+
+            module.context.verify()
+
+    # Add a declaration to the module
+    def declare(self, declaration:Declaration):
+        value = declaration.value
+
+        if declaration.child:
+            name = value.name
+
+            if isinstance(value, Method) and name in self.module.context:
+                self.module.context[name].assimilate(value)
+            else:
+                self.module.context.addChild(value)
+            self.children.setdefault(name, []).append(declaration)
+
+            if name in self.remaining:
+                self.remaining[name] -= 1
+                self.wake(name)
+        else:
+            self.module.main.append(value)
+            self.instructions.append(declaration)
+
+        for name in declaration.assigns & self.unassigned:
+            self.assigners.setdefault(name, []).append(declaration)
+
+    def complete(self, name:str):
+        return self.remaining.get(name, 0) <= 0 and name not in self.unassigned
+
+    # Whether a declaration is the first one which may assign a name
+    def assignsFirst(self, declaration:Declaration, name:str):
+        for assigner in self.assigners.get(name, []):
+            if not assigner.verified:
+                return assigner is declaration
+        return False
+
+    # Find a name blocking the verification of a declaration, END if it must
+    # wait for the end of the stream, or None if it can be verified
+    def blocker(self, declaration:Declaration):
+        seen = {declaration}
+        stack = [declaration]
+
+        while stack:
+            current = stack.pop()
+            if current.mentions is None:
+                return self.END
+
+            for name in current.mentions:
+                if name not in self.remaining and name not in self.unassigned:
+                    continue
+
+                if self.remaining.get(name, 0) > 0:
+                    return name
+                if name in self.unassigned and not (current is declaration and self.assignsFirst(declaration, name)):
+                    return name
+
+                # Verifying the declaration may verify the children it refers to
+                for child in self.children.get(name, []):
+                    if not child.verified and child not in seen:
+                        seen.add(child)
+                        stack.append(child)
+
+        return None
+
+    def schedule(self, declarations:[Declaration]):
+        for declaration in declarations:
+            heappush(self.queue, (declaration.index, declaration))
+
+    # Wake all declarations waiting for a name, once it is complete
+    def wake(self, name:str):
+        if self.complete(name):
+            self.schedule(self.waiting.pop(name, []))
+
+    # Verify scheduled declarations in order, until all remaining ones wait
+    def process(self):
+        while self.queue:
+            index, declaration = heappop(self.queue)
+            if declaration.verified: continue
+
+            name = self.blocker(declaration)
+            if name is not None:
+                self.waiting.setdefault(name, []).append(declaration)
+                continue
+
+            declaration.verified = True
+            declaration.value.verify()
+
+            for name in declaration.assigns:
+                if name not in self.assigners: continue
+
+                if name in self.module.context:
+                    self.unassigned.discard(name)
+                # Either the name is now complete, or the next declaration
+                # assigning it may go ahead
+                self.schedule(self.waiting.pop(name, []))
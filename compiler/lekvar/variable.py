@@ -1,5 +1,4 @@
 from copy import copy
-from contextlib import contextmanager, ExitStack
 
 from ..errors import *
 
@@ -93,21 +92,13 @@ class Variable(BoundObject, Type):
             self._static_value_type.resolved_type = self.type
         return self._static_value_type
 
-    @contextmanager
+    # Bind the value of the variable for as long as it is targeted
     def targetValue(self, value):
         value = value.resolveValue()
-        old_value = self.value
-        self.value = value
+        forward.assign(self, "value", value)
 
-        stack = ExitStack()
         if self._static_value_type is not None:
-            targets = [(self._static_value_type, value)]
-            stack.enter_context(forward.target(targets))
-
-        with stack:
-            yield
-
-        self.value = old_value
+            forward.bind([(self._static_value_type, value)])
 
     def extractValue(self):
         if self._static_value_type is not None:
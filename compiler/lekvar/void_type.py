@@ -19,6 +19,9 @@ class VoidType(Type, BoundObject):
     def local_context(self):
         raise InternalError("Void does not have a local context")
 
+    def resolveTypeKey(self):
+        return self
+
     def checkCompatibility(self, other:Type, check_cache = None):
         # Void is compatible with all
         return True
@@ -1,15 +1,18 @@
 import os
 import sys
 import uuid
+import hashlib
 import logging
 import subprocess
+from itertools import chain
 from tempfile import TemporaryDirectory
 
-from .. import lekvar
+from .. import lekvar, cache
 from ..errors import *
+from ..backend.util import resolveName, rootModule
 
 from .state import State
-from .builtins import builtins
+from .builtins import builtins, library
 from . import emitter
 from . import bindings
 
@@ -19,17 +22,164 @@ def emit(module:lekvar.Module, logger = logging.getLogger(), opt_level = 1):
     with State.begin(logger):
         module.emit()
 
+    _linkLibrary(logger)
     State.module.verify()
     _optimise(State.module, opt_level, opt_level)
     return State.module.toString()
 
+#
+# Separate Compilation
+#
+# Imported modules may be compiled separately, to object files cached by keys
+# given by the frontend. A program is still emitted as a whole, but modules
+# whose objects are cached are only declared in it. The modules which aren't
+# cached are then split out of the program into their own objects, and the
+# program is linked against all objects.
+
+OBJECT_CACHE = "objects"
+
+def _objectKey(key:str, opt_level:int):
+    # Objects using the builtins library don't define the builtins they use
+    data = "{} {} {} {}".format(key, opt_level, bindings.LLVM_VERSION, State.link_library)
+    return hashlib.sha256(data.encode("UTF-8")).hexdigest()
+
+# The symbol of a function of a separately compiled module, for interfaces
+def unitSymbol(function:lekvar.Function):
+    return resolveName(function, frozenset([rootModule(function)]))
+
+# Whether the object of a module compiled separately is cached
+def isCompiled(key:str, opt_level:int = 1):
+    path = cache.entryPath(OBJECT_CACHE, _objectKey(key, opt_level))
+    return path is not None and os.path.isfile(path)
+
+# Compile a verified module to an executable. The units are the imported
+# modules compiled separately, with the keys identifying their objects
+def build(module:lekvar.Module, units:[(lekvar.Module, str)], logger = logging.getLogger(), opt_level = 1):
+    State.logger = logger.getChild("llvm")
+
+    keys = {unit: _objectKey(key, opt_level) for unit, key in units}
+    objects = {unit: cache.readEntry(OBJECT_CACHE, key) for unit, key in keys.items()}
+    declared = frozenset(unit for unit, data in objects.items() if data is not None)
+
+    with State.begin(logger, frozenset(keys), declared):
+        module.emit()
+
+    _linkLibrary(logger)
+    State.module.verify()
+
+    # Split each emitted module out of a copy of the program
+    program = State.module.toBitcode()
+    prefixes = {unit: resolveName(unit, State.units) + "." for unit in keys}
+    emitted = {}
+    for unit, prefix in prefixes.items():
+        if unit in declared: continue
+
+        unit_module = bindings.Module.fromBitcode(program)
+        _extractUnit(unit_module, prefix, prefixes.values())
+        _optimise(unit_module, opt_level, opt_level)
+        emitted[unit] = unit_module.toBitcode()
+
+        _externaliseUnit(State.module, prefix)
+
+    _optimise(State.module, opt_level, opt_level)
+
+    with TemporaryDirectory() as build_dir:
+        # Independent objects are compiled in parallel
+        for unit, data in _compileObjects(emitted, build_dir).items():
+            cache.writeEntry(OBJECT_CACHE, keys[unit], data)
+            objects[unit] = data
+
+        return _link(State.module.toBitcode(), list(objects.values()), build_dir)
+
+# Leave only the definitions of a module in a copy of the program. Other
+# separately compiled modules and variables are linked against, and everything
+# else the module uses is kept internally
+def _extractUnit(module:bindings.Module, prefix:str, prefixes:[str]):
+    module.getFunction("main").delete()
+
+    for function in list(module.functions()):
+        name = function.name.decode("UTF-8")
+        if function.is_declaration or name.startswith(prefix): continue
+
+        if name.startswith(tuple(prefixes)):
+            # Objects only depend on the interfaces of other modules
+            function.linkage = bindings.Linkage.available_externally
+            function.addAttr(bindings.AttributeKind.NoInline)
+        else:
+            function.linkage = bindings.Linkage.internal
+
+    for variable in module.variables():
+        name = variable.name.decode("UTF-8")
+        if variable.is_declaration or name.startswith(prefix): continue
+
+        # Variables are shared, not copied
+        if name.startswith("lekvar."):
+            variable.linkage = bindings.Linkage.available_externally
+        else:
+            variable.linkage = bindings.Linkage.internal
+
+# Make the definitions of a separately compiled module external to the
+# program. They are still available to the optimiser
+def _externaliseUnit(module:bindings.Module, prefix:str):
+    for value in chain(module.functions(), module.variables()):
+        if value.is_declaration: continue
+
+        if value.name.decode("UTF-8").startswith(prefix):
+            value.linkage = bindings.Linkage.available_externally
+
+def _compileObjects(units:{lekvar.Module: bytes}, build_dir:str):
+    processes = {}
+    for unit, bitcode in units.items():
+        path = os.path.join(build_dir, _get_tempname(suffix=".bc"))
+        with open(path, "wb") as f:
+            f.write(bitcode)
+
+        processes[unit] = path + ".o", subprocess.Popen([
+                bindings.clang(),
+                "-c", "-o", path + ".o", path
+            ], stdout = subprocess.PIPE, stderr = subprocess.STDOUT)
+
+    objects = {}
+    for unit, (path, process) in processes.items():
+        output, _ = process.communicate()
+        if process.returncode != 0:
+            raise ExecutionError("clang error compiling object {}".format(output.decode("UTF-8")))
+
+        with open(path, "rb") as f:
+            objects[unit] = f.read()
+    return objects
+
+def _link(program:bytes, objects:[bytes], build_dir:str):
+    paths = []
+    for data, suffix in [(program, ".bc")] + [(object, ".o") for object in objects]:
+        paths.append(os.path.join(build_dir, _get_tempname(suffix=suffix)))
+        with open(paths[-1], "wb") as f:
+            f.write(data)
+
+    out_name = os.path.join(build_dir, _get_tempname())
+    try:
+        subprocess.check_output([bindings.clang(), "-o", out_name] + paths, stderr = subprocess.STDOUT)
+    except subprocess.CalledProcessError as e:
+        raise ExecutionError("clang error linking objects {}".format(e.output.decode("UTF-8")))
+
+    with open(out_name, "rb") as f:
+        return f.read()
+
 def run(module:lekvar.Module, logger = logging.getLogger(), opt_level = 1):
     code = emit(module, logger, opt_level)
 
     return interpret(code)
 
+# Link the builtins library into the emitted module, if it is used
+def _linkLibrary(logger = logging.getLogger()):
+    if State.link_library:
+        State.module.link(bindings.Module.fromBitcode(library(logger)))
+
 def _optimise(module:bindings.Module, level:int, size_level:int):
     manager = bindings.PassManager.new()
+    # Remove the unused functions of the builtins library first
+    if State.link_library:
+        manager.addGlobalDCE()
     manager.setOptLevel(level)
     manager.setOptSizeLevel(size_level)
     return bool(manager.run(module))
@@ -45,7 +195,7 @@ def _get_tempname(suffix = ""):
 #TODO: Replace with direct calls to llvm
 def interpret(source:bytes, precommands = []):
     try:
-        return subprocess.check_output(precommands + [bindings.LLI],
+        return subprocess.check_output(precommands + [bindings.lli()],
             input = source,
             stderr = subprocess.STDOUT,
         )
@@ -54,7 +204,7 @@ def interpret(source:bytes, precommands = []):
 
 # Same as interpret, except doesn't capture output
 def interpret_direct(source:bytes):
-    subprocess.Popen([bindings.LLI],
+    subprocess.Popen([bindings.lli()],
         stdin = subprocess.PIPE,
         stdout = sys.stdout,
         stderr = sys.stderr
@@ -74,7 +224,7 @@ def compile(source:bytes):
 
             out_name = os.path.join(build_dir, _get_tempname())
             subprocess.check_output([
-                    bindings.CLANG,
+                    bindings.clang(),
                     "-v", "-o", out_name, f_in.name
                 ], stderr = subprocess.STDOUT)
             return open(out_name, 'rb').read()
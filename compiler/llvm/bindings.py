@@ -3,6 +3,7 @@ import shutil
 from ctypes import *
 import traceback
 import logging
+from functools import lru_cache
 
 # Set platform specific constants
 if sys.platform.startswith("linux"):
@@ -12,13 +13,41 @@ elif sys.platform.startswith("darwin"):
 else:
     raise OSError("{} is not yet supported".format(sys.platform))
 
-# Load the latest supported llvm version
+# The latest supported llvm version
 LLVM_VERSION = '3.6'
-try:
-    _lib = CDLL(DLL_NAME.format(LLVM_VERSION))
-except OSError:
-    raise OSError("Failed to load llvm {} Make sure the dll is installed and in the right place.".format(LLVM_VERSION))
 
+# The llvm library is only loaded once the first function is called. Argument
+# and return types are set when a function is first looked up, so that importing
+# the bindings stays cheap
+class Library:
+    dll = None
+    types = None
+
+    def __init__(self, name:str):
+        self.name = name
+        self.types = {}
+
+    def load(self):
+        if self.dll is None:
+            try:
+                self.dll = CDLL(self.name)
+            except OSError:
+                raise OSError("Failed to load llvm {} Make sure the dll is installed and in the right place.".format(LLVM_VERSION))
+        return self.dll
+
+    def __getattr__(self, name:str):
+        func = getattr(self.load(), name)
+        if name in self.types:
+            func.argtypes, func.restype = self.types[name]
+
+        # Cache the function, bypassing further lookups
+        setattr(self, name, func)
+        return func
+
+_lib = Library(DLL_NAME.format(LLVM_VERSION))
+
+# Find an llvm executable, the first time it is needed
+@lru_cache()
 def llvm_cmd(cmd, fail_ok = False):
     # First try the version specific command
     path = shutil.which("{}-{}".format(cmd, LLVM_VERSION))
@@ -30,8 +59,11 @@ def llvm_cmd(cmd, fail_ok = False):
         raise OSError("Failed to find required executable: {}".format(cmd))
     return path
 
-LLI = llvm_cmd("lli")
-CLANG = llvm_cmd("clang", True)
+def lli():
+    return llvm_cmd("lli")
+
+def clang():
+    return llvm_cmd("clang", True)
 
 c_bool = c_int
 
@@ -41,15 +73,19 @@ class NullException(Exception):
 class VerificationError(Exception):
     pass
 
+class BitcodeError(Exception):
+    pass
+
+class LinkError(Exception):
+    pass
+
 #
 # Wrapping tools
 #
 
-# Set the calling convention of a function in _lib
+# Set the calling convention of a function in _lib, once it is looked up
 def setTypes(name:str, args:[], ret = None):
-    func = getattr(_lib, name)
-    func.argtypes = args
-    func.restype = ret
+    _lib.types[name] = args, ret
 
 # Convert a list of python argument types to a list of C argument types
 def convertArgtypes(types):
@@ -216,6 +252,9 @@ class PassManager(Wrappable, c_void_p):
 class TargetData(Wrappable, c_void_p):
     pass
 
+class MemoryBuffer(Wrappable, c_void_p):
+    pass
+
 __all__ = """Context Module Builder Type Pointer Int Float Function Block Value
 FunctionValue""".split()
 
@@ -224,7 +263,9 @@ FunctionValue""".split()
 # Internal usage only
 
 setTypes("LLVMDisposeMessage", [c_char_p], None)
-disposeError = _lib.LLVMDisposeMessage
+
+def disposeError(message):
+    _lib.LLVMDisposeMessage(message)
 
 #
 # Context
@@ -257,6 +298,24 @@ Module.wrapInstanceFunc("getType", "LLVMGetTypeByName", [c_char_p], Type)
 Module.wrapInstanceFunc("addFunction", "LLVMAddFunction", [c_char_p, Function], FunctionValue)
 Module.wrapInstanceFunc("getFunction", "LLVMGetNamedFunction", [c_char_p], FunctionValue)
 Module.wrapInstanceFunc("addVariable", "LLVMAddGlobal", [Type, c_char_p], Value)
+Module.wrapInstanceFunc("getFirstFunction", "LLVMGetFirstFunction", [], FunctionValue, check_null=False)
+Module.wrapInstanceFunc("getFirstVariable", "LLVMGetFirstGlobal", [], Value, check_null=False)
+
+# Iterate through the functions of the module
+def Module_functions(self):
+    function = self.getFirstFunction()
+    while function:
+        yield function
+        function = function.getNext()
+Module.functions = Module_functions
+
+# Iterate through the global variables of the module
+def Module_variables(self):
+    variable = self.getFirstVariable()
+    while variable:
+        yield variable
+        variable = variable.getNextVariable()
+Module.variables = Module_variables
 
 setTypes("LLVMVerifyModule", [Module, c_int, POINTER(c_char_p)], c_bool)
 
@@ -272,6 +331,52 @@ def Module_verify(self):
         raise VerificationError(message)
 Module.verify = Module_verify
 
+setTypes("LLVMWriteBitcodeToMemoryBuffer", [Module], MemoryBuffer)
+
+@logged("toBitcode", "LLVMWriteBitcodeToMemoryBuffer")
+def Module_toBitcode(self):
+    return _lib.LLVMWriteBitcodeToMemoryBuffer(self).toBytes()
+Module.toBitcode = Module_toBitcode
+
+setTypes("LLVMParseBitcode", [MemoryBuffer, POINTER(Module), POINTER(c_char_p)], c_bool)
+
+@classmethod
+@logged("fromBitcode", "LLVMParseBitcode")
+def Module_fromBitcode(cls, data:bytes):
+    buffer = MemoryBuffer.fromBytes(data, len(data), "")
+    module = Module()
+    error_msg = c_char_p()
+
+    if _lib.LLVMParseBitcode(buffer, byref(module), byref(error_msg)):
+        message = "LLVM: \"{}\"".format(error_msg.value.decode("UTF-8"))
+        disposeError(error_msg)
+
+        raise BitcodeError(message)
+    return module
+Module.fromBitcode = Module_fromBitcode
+
+setTypes("LLVMLinkModules", [Module, Module, c_uint, POINTER(c_char_p)], c_bool)
+
+# Link another module into this one, destroying the other module
+@logged("link", "LLVMLinkModules", False)
+def Module_link(self, other):
+    error_msg = c_char_p()
+    failed = _lib.LLVMLinkModules(self, other, LinkerMode.DestroySource, byref(error_msg))
+
+    # The other module is already disposed of
+    other.value = None
+
+    if failed:
+        message = "LLVM: \"{}\"".format(error_msg.value.decode("UTF-8"))
+        disposeError(error_msg)
+
+        raise LinkError(message)
+Module.link = Module_link
+
+class LinkerMode:
+    DestroySource = 0
+    PreserveSource = 1
+
 class FailureAction:
     AbortProcessAction = 0 # verifier will print to stderr and abort()
     PrintMessageAction = 1 # verifier will print to stderr and return 1
@@ -491,6 +596,29 @@ Value.wrapConstructor("constStruct", "LLVMConstNamedStruct", [Struct, [Value]])
 Value.wrapInstanceFunc("dump", "LLVMDumpValue")
 Value.wrapInstanceProp("initializer", "LLVMGetInitializer", "LLVMSetInitializer", Value)
 Value.wrapInstanceProp("opcode", "LLVMGetInstructionOpcode", None, c_uint)
+Value.wrapInstanceProp("linkage", "LLVMGetLinkage", "LLVMSetLinkage", c_uint)
+Value.wrapInstanceProp("name", "LLVMGetValueName", "LLVMSetValueName", c_char_p)
+Value.wrapInstanceProp("is_declaration", "LLVMIsDeclaration", None, c_bool)
+Value.wrapInstanceFunc("getNextVariable", "LLVMGetNextGlobal", [], Value, check_null=False)
+
+class Linkage:
+    external = 0
+    available_externally = 1
+    link_once_any = 2
+    link_once_odr = 3
+    link_once_odr_auto_hide = 4
+    weak_any = 5
+    weak_odr = 6
+    appending = 7
+    internal = 8
+    private = 9
+    dll_import = 10
+    dll_export = 11
+    external_weak = 12
+    ghost = 13
+    common = 14
+    linker_private = 15
+    linker_private_weak = 16
 
 class Opcode:
     #Terminator Instructions
@@ -566,6 +694,8 @@ FunctionValue.wrapInstanceFunc("appendBlock", "LLVMAppendBasicBlock", [c_char_p]
 FunctionValue.wrapInstanceFunc("getLastBlock", "LLVMGetLastBasicBlock", [], Block)
 FunctionValue.wrapInstanceFunc("getFirstBlock", "LLVMGetFirstBasicBlock", [], Block)
 FunctionValue.wrapInstanceFunc("getParam", "LLVMGetParam", [c_uint], Value)
+FunctionValue.wrapInstanceFunc("delete", "LLVMDeleteFunction")
+FunctionValue.wrapInstanceFunc("getNext", "LLVMGetNextFunction", [], FunctionValue, check_null=False)
 
 FunctionValue.wrapInstanceFunc("addAttr", "LLVMAddFunctionAttr", [c_uint])
 FunctionValue.wrapInstanceFunc("getAttr", "LLVMGetFunctionAttr", [], c_uint)
@@ -612,6 +742,7 @@ PassManager.wrapConstructor("new", "LLVMCreatePassManager")
 PassManager.wrapDestructor("LLVMDisposePassManager")
 
 PassManager.wrapInstanceFunc("run", "LLVMRunPassManager", [Module], c_bool)
+PassManager.wrapInstanceFunc("addGlobalDCE", "LLVMAddGlobalDCEPass")
 
 setTypes("LLVMPassManagerBuilderCreate", [], c_void_p)
 setTypes("LLVMPassManagerBuilderDispose", [c_void_p])
@@ -645,6 +776,20 @@ TargetData.wrapInstanceFunc("bitSizeOf", "LLVMSizeOfTypeInBits", [Type], c_ulong
 TargetData.wrapInstanceFunc("storeSizeOf", "LLVMStoreSizeOfType", [Type], c_ulonglong)
 TargetData.wrapInstanceFunc("abiSizeOf", "LLVMABISizeOfType", [Type], c_ulonglong)
 
+#
+# Memory Buffers
+#
+
+MemoryBuffer.wrapConstructor("fromBytes", "LLVMCreateMemoryBufferWithMemoryRangeCopy", [c_char_p, c_size_t, c_char_p])
+MemoryBuffer.wrapDestructor("LLVMDisposeMemoryBuffer")
+
+MemoryBuffer.wrapInstanceProp("start", "LLVMGetBufferStart", None, c_void_p)
+MemoryBuffer.wrapInstanceProp("size", "LLVMGetBufferSize", None, c_size_t)
+
+def MemoryBuffer_toBytes(self):
+    return string_at(self.start, self.size)
+MemoryBuffer.toBytes = MemoryBuffer_toBytes
+
 #
 # Globals
 #
@@ -1,11 +1,20 @@
+import sys
+import hashlib
 import logging
+import platform
 from functools import partial
 
 from .state import State
 from .util import *
-from .. import lekvar
+from .. import lekvar, cache
 from . import bindings as llvm
 
+LIBRARY_CACHE = "llvm"
+# The prefix of the symbols of all functions in the builtins library
+LIBRARY_PREFIX = "jam.builtins."
+
+library_cache = None
+
 def builtins(logger = logging.getLogger()):
     global printf
     printf = None
@@ -62,7 +71,8 @@ def builtins(logger = logging.getLogger()):
             functions.append(
                 LLVMFunction("", [type, type], return_type,
                     partial(llvmInstructionWrapper, instruction,
-                            args_before=arguments)
+                            args_before=arguments),
+                    librarySymbol(name, [type, type])
                 )
             )
         builtin_objects.append(
@@ -87,7 +97,7 @@ def builtins(logger = logging.getLogger()):
 
     builtin_objects.append(
         lekvar.Method("print",
-            [LLVMFunction("", [type], None, partial(llvmPrintfWrapper, type))
+            [LLVMFunction("", [type], None, partial(llvmPrintfWrapper, type), librarySymbol("print", [type]))
             for type in (ints + floats + [string])],
         ),
     )
@@ -101,6 +111,63 @@ def builtins(logger = logging.getLogger()):
     module.verify()
     return module
 
+#
+# Builtins Library
+#
+# With State.link_library set, the bodies of all LLVMFunctions are emitted once
+# into a bitcode library, instead of into every module using them. Modules only
+# declare the functions they use, and link the library once emitted. The
+# library is kept on disk, keyed by the llvm version and the platform it was
+# emitted for.
+
+def librarySymbol(name:str, arguments:[lekvar.Type]):
+    return LIBRARY_PREFIX + ".".join([name] + [type.name for type in arguments])
+
+def _libraryKey():
+    hash = hashlib.sha256(cache.compilerVersion().encode("UTF-8"))
+    hash.update("{} {} {}".format(llvm.LLVM_VERSION, sys.platform, platform.machine()).encode("UTF-8"))
+    return hash.hexdigest()
+
+# The bitcode of the builtins library
+def library(logger = logging.getLogger()):
+    global library_cache
+    if library_cache is not None:
+        return library_cache
+
+    key = _libraryKey()
+    library_cache = cache.readEntry(LIBRARY_CACHE, key)
+    if library_cache is None:
+        library_cache = emitLibrary(logger)
+        cache.writeEntry(LIBRARY_CACHE, key, library_cache)
+
+    return library_cache
+
+# All functions of a builtins module which belong in the library
+def libraryFunctions(module:lekvar.Module):
+    for child in module.context:
+        if isinstance(child, LLVMFunction):
+            yield child
+        elif isinstance(child, lekvar.Method):
+            for overload in child.overload_context:
+                if isinstance(overload, LLVMFunction):
+                    yield overload
+
+def emitLibrary(logger = logging.getLogger()):
+    global printf
+    module = builtins(logger)
+
+    with State.beginLibrary(logger):
+        for function in libraryFunctions(module):
+            function.emit()
+            # Unused functions are removed once the library is linked
+            function.llvm_value.linkage = llvm.Linkage.link_once_odr
+
+        State.module.verify()
+        data = State.module.toBitcode()
+
+    printf = None
+    return data
+
 def llvmInstructionWrapper(instruction, self, args_before = [], args_after = []):
     entry = self.llvm_value.appendBlock("")
 
@@ -210,8 +277,13 @@ class LLVMType(lekvar.Type, lekvar.BoundObject):
 class LLVMFunction(lekvar.ExternalFunction):
     generator = None
 
-    def __init__(self, name:str, arguments:[lekvar.Type], return_type:lekvar.Type, generator):
-        lekvar.ExternalFunction.__init__(self, name, name, arguments, return_type)
+    def __init__(self, name:str, arguments:[lekvar.Type], return_type:lekvar.Type, generator, symbol:str = None):
+        # Functions of the builtins library are linked by their symbols
+        if State.link_library:
+            symbol = symbol or librarySymbol(name, arguments)
+        else:
+            symbol = name
+        lekvar.ExternalFunction.__init__(self, name, symbol, arguments, return_type)
         self.generator = generator
 
     @property
@@ -226,4 +298,6 @@ class LLVMFunction(lekvar.ExternalFunction):
     def emit(self):
         if self.llvm_value is None:
             lekvar.ExternalFunction.emit(self)
-            self.generator(self)
+            # Modules may link the bodies from the builtins library
+            if State.library or not State.link_library:
+                self.generator(self)
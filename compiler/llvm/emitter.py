@@ -183,10 +183,11 @@ def Variable_emit(self):
         self.llvm_self_index >= 0): return
 
     type = self.type.emitType()
-    name = resolveName(self)
+    name = resolveName(self, State.units)
     if self.stats.static:
         self.llvm_value = State.module.addVariable(type, name)
-        self.llvm_value.initializer = llvm.Value.undef(type)
+        if not State.isDeclared(self):
+            self.llvm_value.initializer = llvm.Value.undef(type)
     else:
         self.llvm_value = State.alloca(type, name)
 
@@ -554,13 +555,15 @@ def Function_emit(self):
     if self.llvm_value is not None: return
 
     self.emitStatic()
-    self.emitBody()
+    # Functions of modules compiled separately are only declared
+    if not State.isDeclared(self):
+        self.emitBody()
 
 @patch
 def Function_emitStatic(self):
     self.llvm_closure_type = self.closed_context.emitType()
 
-    name = resolveName(self)
+    name = resolveName(self, State.units)
     func_type = self.resolveType().emitFunctionType(self.llvm_closure_type is not None)
     self.llvm_value = State.module.addFunction(name, func_type)
 
@@ -785,6 +788,9 @@ def Method_resetLocalEmission(self):
 
 @patch
 def Method_emit(self):
+    # Methods deferred until they are used are left out when unused
+    if not self.verified: return
+
     for overload in self.overload_context:
         if not overload.stats.forward:
             overload.emit()
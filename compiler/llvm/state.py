@@ -2,20 +2,34 @@ import logging
 from contextlib import contextmanager
 
 from .. import lekvar
+from ..backend.util import rootModule
 
 from . import bindings as llvm
 
 # Global state for the llvm emitter
 # Wraps a single llvm module
 class State:
+    # Whether builtins are linked from the builtins library, instead of being
+    # emitted into every module using them
+    link_library = False
+    # Whether the builtins library is being emitted
+    library = False
+    # The modules compiled separately, whose names are prefixed by their module
+    units = frozenset()
+    # The modules whose definitions are in separately compiled objects
+    declared = frozenset()
+
     @classmethod
     @contextmanager
-    def begin(cls, logger:logging.Logger):
+    def begin(cls, logger:logging.Logger, units:{lekvar.Module} = frozenset(), declared:{lekvar.Module} = frozenset()):
         cls.logger = logger
 
         # Dirty hack for circular import. Hook this state into the llvm bindigns
         llvm.State = cls
 
+        cls.library = False
+        cls.units = units
+        cls.declared = declared
         cls.self = None
         cls.builder = llvm.Builder.new()
         cls.module = llvm.Module.fromName("")
@@ -36,6 +50,39 @@ class State:
             return_value = llvm.Value.constInt(llvm.Int.new(32), 0, False)
             cls.builder.ret(return_value)
 
+        cls.declared = frozenset()
+
+    # Begin a module for the builtins library, which has no main function
+    @classmethod
+    @contextmanager
+    def beginLibrary(cls, logger:logging.Logger):
+        cls.logger = logger
+        llvm.State = cls
+
+        cls.library = True
+        cls.units = frozenset()
+        cls.self = None
+        cls.builder = llvm.Builder.new()
+        cls.module = llvm.Module.fromName("builtins")
+        cls.target_data = llvm.TargetData.new("")
+
+        # The builder needs a position to return to after emitting a function
+        init_type = llvm.Function.new(llvm.Type.void(), [], False)
+        init = cls.module.addFunction("", init_type)
+        cls.builder.positionAtEnd(init.appendBlock("entry"))
+
+        try:
+            yield
+        finally:
+            init.delete()
+            cls.library = False
+
+    # Whether an object is only declared, as it is defined in a separately
+    # compiled object
+    @classmethod
+    def isDeclared(cls, object:lekvar.BoundObject):
+        return bool(cls.declared) and rootModule(object) in cls.declared
+
     @classmethod
     def addMainInstructions(cls, instructions:[lekvar.Object]):
         last_block = cls.main.getLastBlock().getPrevious()
@@ -4,6 +4,12 @@ def pytest_addoption(parser):
     parser.addoption("--valgrind", action="store_true", default=False,
         help="Use valagrind to check for memory leaks in compiled programs")
 
+# Keep tests from using the caches of the user, or the results of earlier
+# runs. Tests of the caches enable them in a temporary directory
+@pytest.fixture(autouse=True)
+def disable_cache(monkeypatch):
+    monkeypatch.setenv("JAM_NO_CACHE", "1")
+
 def pytest_generate_tests(metafunc):
     # Pass the py.test -v flag to any verbosity parameters for tests
     if "verbosity" in metafunc.fixturenames:
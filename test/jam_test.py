@@ -1,11 +1,17 @@
+import os
 import sys
+import json
 from io import StringIO
 
 import pytest
 import logging
 
-from compiler import jam, lekvar, llvm
-from compiler.jam.lexer import Tokens, Lexer
+import compiler.cache
+from compiler import jam, lekvar, llvm, errors
+from compiler.jam.lexer import Tokens, Lexer, NFALexer, scanSource, readSource
+from compiler.jam.parser import Parser
+from compiler.backend.util import resolveName
+from programs import TEST_FILES
 
 def test_lexer():
     test = """# def:end )=
@@ -62,6 +68,622 @@ defend+_- end"""
             assert token is not None
             assert token.type == output
 
+def test_token_stream():
+    with StringIO('foo "a\\"b" `c`\n') as input:
+        lexer = Lexer(input)
+        tokens = [lexer.lex() for i in range(4)]
+
+    assert [token.type for token in tokens] == [Tokens.identifier, Tokens.format_string, Tokens.string, Tokens.newline]
+    assert [token.data for token in tokens] == ["foo", 'a\\"b', "c", "\n"]
+    assert [(token.start, token.end) for token in tokens] == [(0, 3), (4, 10), (11, 14), (14, 15)]
+
+    # Tokens are views into the stream
+    stream = lexer.stream
+    assert len(stream) == 4
+    assert stream[1].data == tokens[1].data
+    # Their data is only decoded once
+    assert tokens[1].data is tokens[1].data
+
+def test_line_index():
+    with StringIO("a\n\nbc d\ne") as input:
+        lexer = Lexer(input)
+        index = input.line_index
+
+    assert index is lexer.line_index
+    assert index.getLine(0) == (1, 0, 2)
+    assert index.getLine(2) == (2, 2, 3)
+    assert index.getLine(6) == (3, 3, 8)
+    assert index.getLine(8) == (4, 8, 10)
+    assert index.slice(3, 8) == "bc d\n"
+
+def test_error_columns(tmpdir):
+    path = tmpdir.join("columns.jm")
+    path.write_text('x = "\u00e4\u00f6\u00fc" + y\n', "utf-8")
+
+    with path.open("r", encoding="utf-8") as input:
+        lexer = Lexer(input)
+        token = lexer.lex()
+        while token.data != "y":
+            token = lexer.lex()
+
+        message, appendix = errors.CompilerError(message="", tokens=[token], source=input).messages[0].format()
+
+    # Carets are aligned with characters, not bytes
+    line, highlight = appendix.splitlines()
+    assert highlight.index("^") == line.index("y")
+    assert highlight.count("^") == 1
+
+def lexAll(lexer_class, input):
+    tokens = []
+    try:
+        lexer = lexer_class(input)
+        token = lexer.lex()
+        while token is not None:
+            tokens.append((token.type, token.start, token.end, token.data))
+            token = lexer.lex()
+    except errors.SyntaxError as e:
+        return tokens, [(t.start, t.end) for m in e.messages if m.tokens for t in m.tokens]
+    return tokens, None
+
+# Differential tests of the compiled lexer against the lex tree
+for file in TEST_FILES:
+    def test(file = file):
+        with open(file.path, "r") as f:
+            source = f.read()
+            # Lexes from a memory map of the file
+            output = lexAll(Lexer, f)
+
+        with StringIO(source) as input:
+            assert output == lexAll(NFALexer, input)
+
+    globals()["test_lexer_dfa_" + file.name] = test
+
+# Differential tests of scanning against lexing. Sources which cannot be
+# scanned are lexed instead
+for file in TEST_FILES:
+    def test(file = file):
+        with open(file.path, "r") as f:
+            tokens, error = lexAll(Lexer, f)
+            stream = scanSource(readSource(f), f.encoding)
+
+        if stream is not None:
+            assert error is None
+            assert tokens == [(stream.types[index], stream.starts[index], stream.ends[index], stream.data(index))
+                              for index in range(len(stream))]
+
+    globals()["test_scanner_" + file.name] = test
+
+del test
+
+class ChunkedSource:
+    def __init__(self, lines):
+        self.lines = lines
+
+    def readChunk(self):
+        if not self.lines: return None
+        return self.lines.pop(0)
+
+def test_lexer_chunked():
+    lines = ["def a(b)\n", "  return b + 1_0 # c\n", "end\n", "print(\"x\")\n"]
+
+    with StringIO("".join(lines)) as input:
+        expected = lexAll(Lexer, input)
+    assert expected == lexAll(Lexer, ChunkedSource(lines))
+
+def test_parser_look_ahead():
+    with StringIO("a b c d") as input:
+        parser = jam.parser.Parser(Lexer(input), logging.getLogger())
+
+        assert parser.lookAhead(2).data == "b"
+        assert parser.next().data == "a"
+        mark = parser.mark()
+        assert parser.lookAhead(3).data == "d"
+        assert parser.next().data == "b"
+        assert parser.next().data == "c"
+
+        parser.reset(mark)
+        assert parser.lookAhead().data == "b"
+        assert [parser.next().data for i in range(3)] == ["b", "c", "d"]
+        assert parser.next() is None
+        assert parser.lookAhead() is None
+
+def test_lazy_parsing():
+    source = "def f(a)\n    def g()\n    end\n    if a\n        return 1\n    end\nend\n"
+
+    with StringIO(source) as input:
+        module = jam.parser.parseFile(input, lazy=True)
+
+    function = module.context["f"].overload_context["0"]
+    assert function.body is not None
+    assert "g" not in function.local_context
+
+    instructions = function.instructions
+    assert function.body is None
+    assert len(instructions) == 1 and isinstance(instructions[0], lekvar.Branch)
+    assert "g" in function.local_context
+    assert function.tokens[-1].type == Tokens.end_kwd
+
+def test_lazy_verification():
+    source = "def f(a)\n    return a\nend\ndef g()\n    return h()\nend\nf(1)\n"
+
+    with lekvar.use(jam, llvm), StringIO(source) as input:
+        module = jam.parse(input, lazy=True)
+        lekvar.verify(module)
+
+        # Unused functions are neither parsed nor verified
+        f, g = module.context["f"], module.context["g"]
+        assert f.verified and f.overload_context["0"].body is None
+        assert not g.verified and g.overload_context["0"].body is not None
+
+        # Until the module is used as a whole
+        with pytest.raises(errors.MissingReferenceError):
+            lekvar.verifyDeferred(module)
+
+def test_parse_cache(tmpdir, monkeypatch):
+    monkeypatch.setenv("JAM_CACHE_DIR", str(tmpdir.join("cache")))
+    monkeypatch.delenv("JAM_NO_CACHE", raising=False)
+
+    path = tmpdir.join("main.jm")
+    path.write("def f(a:Int)\n    return a + 1\nend\nf(2)\n")
+
+    with open(str(path)) as input:
+        module = jam.parser.parseFile(input)
+    assert len(tmpdir.join("cache", "parse").listdir()) == 1
+
+    # Unchanged sources are loaded without being parsed
+    with monkeypatch.context() as patch:
+        patch.setattr(jam.parser.Parser, "parseModule", None)
+        with open(str(path)) as input:
+            cached = jam.parser.parseFile(input)
+            assert cached.source is input
+            assert cached.name == module.name
+            assert repr(cached.main) == repr(module.main)
+
+    # Unreadable entries are parsed again
+    tmpdir.join("cache", "parse").listdir()[0].write(b"corrupt", "wb")
+    with open(str(path)) as input:
+        assert repr(jam.parser.parseFile(input).main) == repr(module.main)
+
+    # Changed sources are parsed again
+    path.write("f(3)\n")
+    with open(str(path)) as input:
+        assert repr(jam.parser.parseFile(input).main) != repr(module.main)
+    assert len(tmpdir.join("cache", "parse").listdir()) == 2
+
+def test_build_cache(tmpdir, monkeypatch):
+    monkeypatch.setenv("JAM_CACHE_DIR", str(tmpdir.join("cache")))
+    monkeypatch.delenv("JAM_NO_CACHE", raising=False)
+
+    tmpdir.join("main.jm").write("import lib\nlib.f()\n")
+    tmpdir.join("lib.jm").write("def f()\nend\n")
+
+    def key(kind = "executable", opt_level = 1):
+        with tmpdir.join("main.jm").open() as input:
+            return jam.buildKey(input, kind, opt_level)
+
+    # Keys depend on all sources, the kind of build and the optimisation level
+    executable = key()
+    assert executable == key()
+    assert executable != key("ir") != key(opt_level = 2)
+    tmpdir.join("lib.jm").write("def f()\n  puts(1)\nend\n")
+    assert key() != executable
+
+    jam.cache.storeBuild(key(), b"program")
+    assert jam.cache.loadBuild(key()) == b"program"
+    assert jam.cache.loadBuild(executable) is None
+    assert jam.buildKey(StringIO("import lib\n"), "executable", 1) is None
+
+def test_cache_eviction(tmpdir, monkeypatch):
+    monkeypatch.setenv("JAM_CACHE_DIR", str(tmpdir))
+    monkeypatch.delenv("JAM_NO_CACHE", raising=False)
+    monkeypatch.setenv("JAM_CACHE_SIZE", str(3000 / (1024 * 1024)))
+
+    for index in range(3):
+        compiler.cache.writeEntry("test", str(index), b"." * 1000)
+        os.utime(str(tmpdir.join("test", str(index))), (index, index))
+    assert compiler.cache.readEntry("test", "0") is not None
+
+    # The least recently used entry is removed once the cache is full
+    compiler.cache.writeEntry("test", "3", b"." * 1000)
+    assert sorted(path.basename for path in tmpdir.join("test").listdir()) == ["0", "2", "3"]
+
+def test_builtins_snapshot(tmpdir, monkeypatch):
+    builtins_module = sys.modules["compiler.jam.builtins"]
+    monkeypatch.setenv("JAM_CACHE_DIR", str(tmpdir))
+    monkeypatch.delenv("JAM_NO_CACHE", raising=False)
+    monkeypatch.setattr(builtins_module, "builtin_cache", None)
+
+    ir = jam.builtins()
+    assert ir.verified
+    assert len(tmpdir.join("builtins").listdir()) == 1
+
+    # Other processes load the verified snapshot without parsing
+    monkeypatch.setattr(builtins_module, "builtin_cache", None)
+    monkeypatch.setattr(builtins_module, "parseBuiltins", None)
+
+    snapshot = jam.builtins()
+    assert snapshot.verified
+    assert snapshot.context["_builtins"] is not None
+    assert sorted(child.name for child in snapshot.context) == sorted(child.name for child in ir.context)
+
+def test_shared_builtins():
+    source = "def f(a)\n    return a\nend\nputs(f(\"a\"))\n"
+
+    with lekvar.use(jam, llvm), StringIO(source) as input:
+        builtins = lekvar.State.builtins
+        forward = builtins.context["_builtins"]
+        assert forward.target is not None
+
+        lekvar.verify(jam.parse(input))
+        assert lekvar.State.overlay.attributes
+
+    # Changes of a session are undone, leaving the builtins for the next one
+    assert forward.target is None
+    with lekvar.use(jam, llvm):
+        assert lekvar.State.builtins is builtins
+
+    with pytest.raises(errors.InternalError):
+        forward.target = builtins
+
+def test_iter_module():
+    with StringIO("x = 1\ndef f()\nend\n)") as input:
+        declarations = Parser(Lexer(input), logging.getLogger()).iterModule()
+
+        assert isinstance(next(declarations), lekvar.Assignment)
+        assert isinstance(next(declarations), lekvar.Method)
+        with pytest.raises(errors.SyntaxError):
+            next(declarations)
+
+def test_stream_verification():
+    source = "x = 1\nputs(f(x))\ndef f(a:Int) -> String\n    return g()\nend\ndef g() -> String\n    return \"a\"\nend\n"
+
+    # Declarations are scanned ahead, and only lexed as they are parsed
+    with StringIO(source) as input:
+        parser = Parser(Lexer(input), logging.getLogger())
+        assert parser.scanModule() == ({"f": 1, "g": 1}, {"x"})
+        assert len(parser.stream) == 0
+
+    with lekvar.use(jam, llvm), StringIO(source) as input:
+        stream = jam.stream(input)
+        assert stream.names == {"f": 1, "g": 1}
+        assert stream.assigned == {"x"}
+
+        # Record which declarations were verified before each one is produced
+        produced, verified = [], []
+        def track(declarations):
+            for declaration in declarations:
+                verified.append([previous.verified for previous in produced])
+                produced.append(declaration)
+                yield declaration
+        stream.declarations = track(stream.declarations)
+
+        module = lekvar.verifyStream(stream)
+
+    # The call waits for f, which waits for g
+    assert verified == [[], [True], [True, False], [True, False, False]]
+    assert all(declaration.verified for declaration in produced)
+    assert module.verified
+
+def test_symbol_tables():
+    source = "x = 1\ndef f(a:Int) -> Int\n    return a + x\nend\n"
+
+    with lekvar.use(jam, llvm), StringIO(source) as input:
+        module = jam.parse(input)
+        lekvar.verify(module)
+
+        function = module.context["f"].overload_context["0"]
+        assert lekvar.resolveSymbol(function, "a") == {function.local_context["a"]}
+        assert lekvar.resolveSymbol(function, "Int") == {lekvar.State.builtins.context["Int"]}
+        assert lekvar.resolveSymbol(function, "x") == {module.context["x"]}
+
+        # New children are found by scopes which resolved their name before
+        assert lekvar.resolveSymbol(function, "g") == set()
+        module.context.addChild(lekvar.Module("g", []))
+        assert lekvar.resolveSymbol(function, "g") == {module.context["g"]}
+
+def test_compatibility_cache():
+    source = "def h(a, b)\n    return a\nend\nh(1, 2)\n"
+
+    with lekvar.use(jam, llvm), StringIO(source) as input:
+        lekvar.verify(jam.parse(input))
+
+        # Forward types are never cached
+        stats = lekvar.State.compatibility_stats
+        assert stats["uncached"] >= 1
+
+        Int = lekvar.State.builtins.context["Int"]
+        Real = lekvar.State.builtins.context["Real"]
+        ints = lekvar.FunctionType([Int, Int], Int)
+        assert ints.resolveTypeKey() == ((Int, Int), Int)
+
+        hits = stats["hits"]
+        assert ints.checkCompatibility(lekvar.FunctionType([Int, Int]))
+        assert ints.checkCompatibility(lekvar.FunctionType([Int, Int]))
+        assert not ints.checkCompatibility(lekvar.FunctionType([Int, Real]))
+        assert stats["hits"] == hits + 1
+
+def test_return_inference_without_type_keys(monkeypatch):
+    source = "def f()\n    return 1\nend\n"
+
+    with lekvar.use(jam, llvm), StringIO(source) as input:
+        module = jam.parser.parseFile(input, lazy=True)
+        lekvar.verify(module)
+
+        # Deferred functions may be verified once the caches are gone
+        monkeypatch.setattr(lekvar.State, "type_keys", None)
+        lekvar.verifyDeferred(module)
+        function = module.context["f"].overload_context["0"]
+        assert function.type.return_type.resolveValue() is lekvar.State.builtins.context["Int"]
+
+def test_overload_index():
+    source = ("def g(a:Int, b:Int) -> Int\n    return a\nend\ndef g(a:Real, b:Real) -> Real\n    return a\nend\n"
+              "def g(a, b)\n    return a\nend\ng(1, 2)\n")
+
+    with lekvar.use(jam, llvm), StringIO(source) as input:
+        module = jam.parse(input)
+        lekvar.verify(module)
+
+        method = module.context["g"]
+        index = lekvar.OverloadIndex.get(method)
+        first, second, forward = method.overload_context
+
+        # Calls only check the overloads of the class of their first argument,
+        # and those which may match any class
+        Int = lekvar.State.builtins.context["Int"]
+        call = lekvar.FunctionType([Int, Int])
+        assert index.candidates(call) == ([first, forward], False)
+        assert index.candidates(lekvar.FunctionType([Int])) == ([], True)
+
+        # Normal matches are preferred over forward ones
+        assert method.resolveCall(call) is first
+
+        # Indices are rebuilt once a signature changes, even if the number of
+        # overloads stays the same
+        method_type = method.resolveType()
+        method_type.resolveInstanceCall(call)
+        second.type.arguments = [Int, Int]
+        lekvar.State.changeSignatures()
+        assert lekvar.OverloadIndex.get(method) is None
+        assert lekvar.OverloadIndex.get(method_type) is None
+        assert method.overloadIndex().candidates(call) == ([first, second, forward], False)
+
+        # So are they once overloads are added
+        method.addOverload(lekvar.Function("", [], []))
+        assert lekvar.OverloadIndex.get(method) is None
+
+def test_function_type_interning():
+    source = "def f(a)\n    return a\nend\nf(1)\nf(2)\n"
+
+    with lekvar.use(jam, llvm), StringIO(source) as input:
+        module = jam.parse(input)
+        lekvar.verify(module)
+
+        # Calls with the same signature share their type, and so their
+        # instantiation of forward functions
+        first, second = module.main
+        assert first.function_type is second.function_type
+        assert first.function is second.function
+
+        Int = lekvar.State.builtins.context["Int"]
+        assert lekvar.FunctionType.intern([Int]) is first.function_type
+        assert lekvar.FunctionType.intern([Int], Int) is not first.function_type
+        assert "interned_hash" not in first.function_type.__getstate__()
+
+def test_forward_trail():
+    source = "def f(a)\n    return a\nend\nf(1)\n"
+
+    with lekvar.use(jam, llvm), StringIO(source) as input:
+        module = jam.parse(input)
+        lekvar.verify(module)
+
+        forward = lekvar.forward
+        argument = lekvar.ForwardObject(module)
+        Int = lekvar.State.builtins.context["Int"]
+        Real = lekvar.State.builtins.context["Real"]
+        mark = len(forward.trail)
+
+        # Nested targets undo their own bindings
+        with forward.target([(argument, Int)], False):
+            assert argument.target is Int
+            with forward.target([(argument, Real)], False):
+                assert argument.target is Real
+            assert argument.target is Int
+            assert len(forward.trail) == mark + 1
+
+        # Bindings are also undone when an error leaves the target
+        with pytest.raises(ValueError):
+            with forward.target([(argument, Int)], False):
+                raise ValueError()
+        assert argument.target is None
+        assert len(forward.trail) == mark
+
+def test_module_registry(tmpdir):
+    path = tmpdir.join("a.jm")
+    path.write("def f()\nend\n")
+    os.link(str(path), str(tmpdir.join("b.jm")))
+
+    with lekvar.use(jam, llvm), tmpdir.join("main.jm").open("w+") as input:
+        input.write("import a\nimport b\n")
+        input.seek(0)
+
+        module = jam.parse(input)
+        lekvar.verify(module)
+        registry = lekvar.State.modules
+
+    # Hardlinks to a file share its module
+    assert module.context["a"].value is module.context["b"].value
+    assert registry.find(str(path)) is module.context["a"].value
+    assert registry.find(str(tmpdir.join(".", "b.jm"))) is module.context["a"].value
+    assert registry.find(str(tmpdir.join("main.jm"))) is module
+    assert registry.find(str(tmpdir.join("c.jm"))) is None
+
+@pytest.mark.skipif(not os.path.isdir("/proc/self/fd"), reason="requires /proc")
+def test_source_descriptors(tmpdir, monkeypatch):
+    monkeypatch.setenv("JAM_NO_CACHE", "1")
+
+    paths = []
+    for index in range(10):
+        path = tmpdir.join("m{}.jm".format(index))
+        path.write("def f()\nend\n")
+        paths.append(str(path))
+
+    descriptors = len(os.listdir("/proc/self/fd"))
+    modules = []
+    for path in paths:
+        with open(path) as input:
+            modules.append(jam.parser.parseFile(input))
+
+    # Parsed modules don't keep their sources open
+    assert len(os.listdir("/proc/self/fd")) == descriptors
+
+def test_search_path(tmpdir, monkeypatch):
+    source = tmpdir.join("src", "main.jm")
+    source.write("import util\n", ensure=True)
+    tmpdir.join("lib", "util.jm").write("def f()\nend\n", ensure=True)
+    tmpdir.join("env", "pkg", "mod.jm").write("def g()\nend\n", ensure=True)
+
+    monkeypatch.setenv("JAM_PATH", str(tmpdir.join("env")))
+    monkeypatch.setattr(jam.search_path, "lib_dirs", [str(tmpdir.join("lib"))])
+
+    search_path = jam.search_path.SearchPath()
+    directory = str(tmpdir.join("src"))
+    assert search_path.find(directory, ["util"]) == (str(tmpdir.join("lib", "util.jm")), 1)
+    assert search_path.find(directory, ["pkg", "mod", "g"]) == (str(tmpdir.join("env", "pkg", "mod.jm")), 2)
+    assert search_path.find(directory, ["missing"]) is None
+
+    # Directories are listed only once
+    listings = len(search_path.listings)
+    search_path.find(directory, ["util"])
+    search_path.find(directory, ["missing"])
+    assert len(search_path.listings) == listings
+
+    with lekvar.use(jam, llvm), source.open() as input:
+        module = jam.parse(input)
+        lekvar.verify(module)
+    assert isinstance(module.context["util"].value, lekvar.Module)
+
+def test_parallel_parsing(tmpdir, monkeypatch):
+    tmpdir.join("a.jm").write("import b\ndef f()\nend\n")
+    tmpdir.join("b.jm").write("def g()\nend\n")
+
+    monkeypatch.setattr(jam.import_, "jobs", 2)
+
+    with lekvar.use(jam, llvm), tmpdir.join("main.jm").open("w+") as input:
+        input.write("import a\n")
+        input.seek(0)
+
+        module = jam.parse(input)
+        assert set(jam.import_.parsed) == {str(tmpdir.join("a.jm")), str(tmpdir.join("b.jm"))}
+
+        lekvar.verify(module)
+
+    assert not jam.import_.parsed
+    a = module.context["a"].value
+    assert a.name == str(tmpdir.join("a.jm"))
+    assert isinstance(a.context["b"].value, lekvar.Module)
+
+def test_interfaces(tmpdir, monkeypatch):
+    shapes = tmpdir.join("shapes.jm")
+    shapes.write("class Point\n  x:Int\n  new(v:Int)\n    x = v\n  end\n  def get() -> Int\n    return x\n  end\nend\n"
+                 "def origin() -> Point\n  return Point(0)\nend\n")
+
+    def verifyMain():
+        with tmpdir.join("main.jm").open("w+") as input:
+            input.write("import shapes\np = shapes.origin()\np.get()\n")
+            input.seek(0)
+
+            module = jam.parse(input)
+            lekvar.verify(module)
+        return module, lekvar.State.modules.find(str(shapes))
+
+    with lekvar.use(jam, llvm):
+        module, imported = verifyMain()
+        jam.interface.writeInterfaces(lekvar.State.modules.modules(), llvm.unitSymbol)
+        summary = jam.interface.summarize(imported, llvm.unitSymbol)
+        units = {unit.name: key for unit, key in jam.interface.compilationUnits(lekvar.State.modules.modules(), llvm.unitSymbol)}
+
+        # Modules with top level instructions have no interface
+        assert tmpdir.join("shapes.jmi").check()
+        assert not tmpdir.join("main.jmi").check()
+
+        monkeypatch.setattr(jam.import_, "interfaces", True)
+        module, imported = verifyMain()
+        point = imported.context["Point"]
+        assert isinstance(imported.context["origin"].overload_context["0"], lekvar.ExternalFunction)
+        assert isinstance(point.instance_context["x"], lekvar.Variable)
+        assert point.instance_context["get"].resolveType().overloads[0].return_type is lekvar.State.builtins.context["Int"]
+        assert point.stats.static
+
+        # Modules loaded from interfaces are summarised like their sources
+        assert jam.interface.summarize(imported, llvm.unitSymbol) == summary
+
+        # Interfaces are only used while their declarations can be built
+        data = tmpdir.join("shapes.jmi").read()
+        tampered = json.loads(data)
+        tampered["declarations"][0]["stats"] = ["forward"]
+        tmpdir.join("shapes.jmi").write(json.dumps(tampered))
+        module, imported = verifyMain()
+        assert isinstance(imported.context["origin"].overload_context["0"], lekvar.Function)
+        tmpdir.join("shapes.jmi").write(data)
+
+        # With separate compilation, modules are only loaded from interfaces
+        # once their objects are cached
+        compiled = []
+        monkeypatch.setattr(jam.import_, "compiled", lambda key: compiled.append(key) or False)
+        module, imported = verifyMain()
+        assert isinstance(imported.context["origin"].overload_context["0"], lekvar.Function)
+        assert compiled == [units[str(shapes)]]
+
+        monkeypatch.setattr(jam.import_, "compiled", lambda key: True)
+        module, imported = verifyMain()
+        assert isinstance(imported.context["origin"].overload_context["0"], lekvar.ExternalFunction)
+
+        # Changed sources are verified again
+        shapes.write("def origin()\nend\n")
+        with pytest.raises(errors.CompilerError):
+            verifyMain()
+        assert isinstance(lekvar.State.modules.find(str(shapes)).context["origin"].overload_context["0"], lekvar.Function)
+
+def test_compilation_units(tmpdir):
+    tmpdir.join("a.jm").write("import b\ndef f() -> b.Point\n  return b.Point()\nend\n")
+    tmpdir.join("b.jm").write("class Point\n  new()\n  end\nend\n")
+    tmpdir.join("c.jm").write("def g(x)\n  return x\nend\n")
+
+    def units():
+        with lekvar.use(jam, llvm), tmpdir.join("main.jm").open("w+") as input:
+            input.write("import a\nimport c\na.f()\n")
+            input.seek(0)
+
+            module = jam.parse(input)
+            lekvar.verify(module)
+            return {unit.name: key for unit, key in jam.interface.compilationUnits(lekvar.State.modules.modules(), llvm.unitSymbol)}
+
+    # Modules without interfaces are compiled with the program
+    keys = units()
+    assert set(keys) == {str(tmpdir.join("a.jm")), str(tmpdir.join("b.jm"))}
+
+    # Objects depend on the interfaces of the modules they refer to
+    tmpdir.join("b.jm").write("class Point\n  x:Int\n  new()\n    x = 0\n  end\nend\n")
+    changed = units()
+    assert changed[str(tmpdir.join("a.jm"))] != keys[str(tmpdir.join("a.jm"))]
+
+def test_unit_names(tmpdir):
+    tmpdir.join("lib.jm").write("def f()\nend\n")
+
+    with lekvar.use(jam, llvm), tmpdir.join("main.jm").open("w+") as input:
+        input.write("import lib\nlib.f()\n")
+        input.seek(0)
+
+        module = jam.parse(input)
+        lekvar.verify(module)
+        lib = lekvar.State.modules.find(str(tmpdir.join("lib.jm")))
+        f = lib.context["f"].overload_context["0"]
+
+    # Only the names of modules compiled separately depend on their location
+    assert resolveName(f) == "lekvar.f.0"
+    name = resolveName(f, {lib})
+    assert name.startswith("lekvar.lib_") and name.endswith(".f.0")
+
 def test_builtin_lib(verbosity):
     logging.basicConfig(level=logging.WARNING - verbosity*10, stream=sys.stdout)
 
@@ -1,6 +1,7 @@
 import os
 import sys
 import logging
+from io import StringIO
 from subprocess import check_output
 
 import pytest
@@ -92,6 +93,71 @@ def test_builtin_lib():
     with open(BUILD_PATH + "/builtins.ll", "wb") as f:
         f.write(source)
 
+def test_builtins_library(monkeypatch):
+    monkeypatch.setattr(llvm.State, "link_library", True)
+    library = llvm.library()
+    assert llvm.library() is library
+
+    module = c.Module.fromBitcode(library)
+    assert module.getFunction("jam.builtins.print.String")
+
+    with pytest.raises(c.BitcodeError):
+        c.Module.fromBitcode(b"not bitcode")
+
+    # Programs linking the library behave like those compiling the builtins
+    outputs = []
+    for link_library in (False, True):
+        monkeypatch.setattr(llvm.State, "link_library", link_library)
+        with lekvar.use(jam, llvm), StringIO("puts(\"a\")\nprint(1)\n") as input:
+            outputs.append(llvm.interpret(lekvar.compile(input, jam, llvm)))
+    assert outputs[0] == outputs[1]
+
+def test_separate_compilation(tmpdir, monkeypatch):
+    monkeypatch.setenv("JAM_CACHE_DIR", str(tmpdir.join("cache")))
+    monkeypatch.delenv("JAM_NO_CACHE", raising=False)
+    tmpdir.join("greet.jm").write("def greet(name:String)\n  puts(name)\nend\n")
+    tmpdir.join("main.jm").write("import greet\ngreet.greet(\"world\")\n")
+
+    def build():
+        with lekvar.use(jam, llvm), tmpdir.join("main.jm").open() as input:
+            module = jam.parse(input)
+            lekvar.verify(module)
+
+            units = jam.interface.compilationUnits(lekvar.State.modules.modules(), llvm.unitSymbol)
+            assert [unit.name for unit, key in units] == [str(tmpdir.join("greet.jm"))]
+            return llvm.build(module, units)
+
+    path = tmpdir.join("a.out")
+    for index in range(2):
+        path.write(build(), "wb")
+        path.chmod(0o775)
+        assert check_output([str(path)]) == b"world\n"
+
+    # The object is only compiled once
+    assert len(tmpdir.join("cache", llvm.OBJECT_CACHE).listdir()) == 1
+
+def test_interface_imports(tmpdir):
+    env = dict(os.environ, JAM_CACHE_DIR=str(tmpdir.join("cache")))
+    env.pop("JAM_NO_CACHE", None)
+    jam_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "jam")
+    tmpdir.join("greet.jm").write("def greet(name:String)\n  puts(name)\nend\n")
+
+    def compile(name, *args):
+        tmpdir.join("main.jm").write("import greet\ngreet.greet(\"{}\")\n".format(name))
+        path = tmpdir.join("a.out")
+        log = check_output([sys.executable, jam_path, "compile", "-v", "--separate", str(tmpdir.join("main.jm")), "-o", str(path)] + list(args),
+            env = env, universal_newlines = True)
+        assert check_output([str(path)]) == "{}\n".format(name).encode("UTF-8")
+        return log
+
+    # The imported module is verified while its object is compiled
+    log = compile("world", "--emit-interface")
+    assert tmpdir.join("greet.jmi").check()
+    assert "from its interface" not in log
+
+    # Once its object is cached, the module is loaded from its interface
+    log = compile("again")
+    assert "greet.jm from its interface" in log
 
 for file in TEST_FILES:
     if file.has_error:
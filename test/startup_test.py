@@ -0,0 +1,28 @@
+import os
+import sys
+import subprocess
+
+JAM_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "jam")
+
+# Modules which are only imported once they are needed
+DEFERRED_MODULES = ["compiler.llvm", "compiler.interpreter", "ctypes", "cProfile", "readline", "concurrent.futures"]
+
+# The names of all modules imported when running jam in a new interpreter
+def importedModules(*args):
+    code = ("import sys, runpy\n"
+            "sys.argv = [{0!r}] + {1!r}\n"
+            "try:\n"
+            "    runpy.run_path({0!r}, run_name='__main__')\n"
+            "except SystemExit:\n"
+            "    pass\n"
+            "print('\\n'.join(sys.modules))\n").format(JAM_PATH, list(args))
+
+    output = subprocess.check_output([sys.executable, "-c", code], universal_newlines = True)
+    return set(output.splitlines())
+
+def test_startup_imports():
+    modules = importedModules("--version")
+
+    assert "compiler" in modules
+    for module in DEFERRED_MODULES:
+        assert module not in modules